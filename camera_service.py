@@ -5,33 +5,99 @@ Camera Service - Central Video Publisher
 
 Required:
 pip install opencv-python zmq pyzmq
+
+Optional (encode JPEG เร็วขึ้นด้วย libjpeg-turbo SIMD):
+pip install PyTurboJPEG
 """
 
 import cv2
 import zmq
 import time
+import struct
 import numpy as np
 from datetime import datetime
 
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+    TURBOJPEG_AVAILABLE = True
+except ImportError:
+    TURBOJPEG_AVAILABLE = False
+
 # --- ตั้งค่า ---
 CAMERA_INDEX = 0  # กล้องหลัก (0)
 ZMQ_PORT = 5555   # Port สำหรับ publish
 FPS_TARGET = 30   # ความเร็วที่ต้องการ (frame/sec)
+JPEG_QUALITY = 85
+RAW_FRAMES = True  # ส่ง BGR ดิบ (ไม่ encode) สำหรับ subscriber บนเครื่องเดียวกัน/LAN
+
+# --- รูปแบบข้อความ ---
+# 1 ข้อความ = header + frame data (CONFLATE ไม่รองรับ multipart)
+# header: timestamp (double), frame_count (uint32), width, height (uint16), format (uint8)
+FRAME_HEADER = struct.Struct('<dIHHB')
+FORMAT_RAW = 0   # BGR uint8 ขนาด (height, width, 3)
+FORMAT_JPEG = 1
+# จำนวน buffer ข้อความที่หมุนใช้ (zmq ส่งแบบ zero-copy จาก buffer เดิม ต้องรอส่งเสร็จก่อนเขียนทับ)
+SEND_BUFFERS = 2
 
 class CameraService:
-    def __init__(self, camera_index=CAMERA_INDEX, port=ZMQ_PORT):
+    def __init__(self, camera_index=CAMERA_INDEX, port=ZMQ_PORT, raw=RAW_FRAMES):
         self.camera_index = camera_index
         self.port = port
+        self.raw = raw  # False = ส่ง JPEG (สำหรับ subscriber ผ่าน WAN)
         self.running = False
         
         # Setup ZeroMQ Publisher
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.PUB)
+        # เก็บแค่ frame ล่าสุดต่อ subscriber (ตัวที่ช้าจะได้ frame ใหม่สุดแทนการต่อคิว)
+        self.socket.setsockopt(zmq.SNDHWM, 1)
+        self.socket.setsockopt(zmq.CONFLATE, 1)
+        self.socket.setsockopt(zmq.LINGER, 0)
         self.socket.bind(f"tcp://*:{port}")
         
+        # JPEG encoder (libjpeg-turbo ถ้ามี ไม่งั้นใช้ cv2.imencode)
+        self._tj = None
+        if TURBOJPEG_AVAILABLE:
+            try:
+                self._tj = TurboJPEG()
+            except Exception as e:
+                print(f"⚠️ โหลด libjpeg-turbo ไม่สำเร็จ ใช้ cv2.imencode แทน: {e}")
+        
         # Camera
         self.cap = None
+        self.mjpeg_passthrough = False  # ส่ง byte MJPEG จากกล้องต่อโดยไม่ encode ใหม่
+        
+        # buffer ข้อความ (header + frame) ที่หมุนใช้ซ้ำ: [bytearray, MessageTracker หรือ None]
+        self._send_buffers = [[bytearray(), None] for _ in range(SEND_BUFFERS)]
+        self._next_buffer = 0
+        
+    def _message_buffer(self, size: int) -> list:
+        """
+        คืน slot [buffer, tracker] ถัดไป ที่ buffer ยาวอย่างน้อย size และ zmq ส่งเสร็จแล้ว (เขียนทับได้)
+        ถ้ายังส่งไม่เสร็จ สร้าง buffer ใหม่แทน (อันเก่า zmq ถือ reference ไว้จนส่งเสร็จ)
+        """
+        slot = self._send_buffers[self._next_buffer]
+        self._next_buffer = (self._next_buffer + 1) % SEND_BUFFERS
+        
+        buffer, tracker = slot
+        if len(buffer) < size or (tracker is not None and not tracker.done):
+            slot[0] = bytearray(size)
+        slot[1] = None
+        return slot
+    
+    def _encode_jpeg(self, frame: np.ndarray) -> bytes:
+        """Encode BGR frame เป็น JPEG bytes"""
+        if self._tj is not None:
+            return self._tj.encode(
+                frame,
+                quality=JPEG_QUALITY,
+                pixel_format=TJPF_BGR,
+                jpeg_subsample=TJSAMP_420
+            )
         
+        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        return buffer.tobytes()
+    
     def start(self):
         """เริ่มต้น Camera Service"""
         print("=" * 60)
@@ -45,10 +111,20 @@ class CameraService:
             print(f"❌ ไม่สามารถเปิดกล้อง index {self.camera_index} ได้")
             return
         
-        # ตั้งค่ากล้อง
+        # ตั้งค่ากล้อง (ขอ MJPEG จากกล้องโดยตรง ต้องตั้งก่อน W/H/FPS)
+        self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
         self.cap.set(cv2.CAP_PROP_FPS, FPS_TARGET)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # ไม่เก็บ frame ค้างใน buffer ของ driver
+        
+        # โหมด JPEG: ขอ byte MJPEG จาก driver ตรงๆ (ไม่ decode แล้ว encode ซ้ำ)
+        # ใช้ได้เฉพาะเมื่อกล้องรับ MJPG จริง (เช็คจาก FOURCC ที่อ่านกลับมา)
+        # กล้องที่ไม่รับ (เช่น YUYV) จะได้ buffer ดิบที่ไม่ใช่ JPEG -> decode เป็น BGR แล้ว encode เอง
+        fourcc = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        self.mjpeg_passthrough = not self.raw and fourcc == cv2.VideoWriter_fourcc(*'MJPG')
+        if self.mjpeg_passthrough:
+            self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
         
         actual_fps = self.cap.get(cv2.CAP_PROP_FPS)
         width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -57,6 +133,11 @@ class CameraService:
         print(f"✅ เปิดกล้องสำเร็จ")
         print(f"   📐 Resolution: {width}x{height}")
         print(f"   ⚡ FPS: {actual_fps:.1f}")
+        if self.raw:
+            print(f"   🗜️ Format: raw BGR (ไม่ encode)")
+        else:
+            encoder = 'MJPEG จากกล้อง' if self.mjpeg_passthrough else ('libjpeg-turbo' if self._tj else 'OpenCV')
+            print(f"   🗜️ Format: JPEG ({encoder})")
         print(f"   🔌 Publishing on: tcp://localhost:{self.port}")
         print(f"\n🚀 กำลัง publish frames...")
         print("   (Subscribers สามารถเชื่อมต่อได้แล้ว)")
@@ -65,30 +146,64 @@ class CameraService:
         self.running = True
         frame_count = 0
         start_time = time.time()
+        frame_interval = 1 / FPS_TARGET
+        next_publish = time.monotonic()
+        
+        frame_format = FORMAT_RAW if self.raw else FORMAT_JPEG
+        frame_size = height * width * 3
         
         try:
             while self.running:
-                ret, frame = self.cap.read()
-                
-                if not ret:
+                # grab() แค่เลื่อน frame ใน driver (ยังไม่ decode)
+                if not self.cap.grab():
                     print("⚠️ ไม่สามารถอ่าน frame จากกล้องได้")
                     time.sleep(0.1)
                     continue
                 
-                # Encode frame เป็น JPEG
-                _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+                # ถ้ายังไม่ถึงรอบ publish ให้ข้าม frame นี้ไปโดยไม่ decode
+                # (เผื่อครึ่ง frame กัน jitter ของกล้อง)
+                now = time.monotonic()
+                if now + frame_interval / 2 < next_publish:
+                    continue
+                next_publish = max(next_publish + frame_interval, now)
+                
+                # ข้อความ = header + frame data ใน buffer เดียว (CONFLATE ไม่รองรับ multipart)
+                if self.raw:
+                    # decode BGR ลงตำแหน่ง frame ใน buffer ข้อความโดยตรง ไม่ต้อง copy ต่อ
+                    slot = self._message_buffer(FRAME_HEADER.size + frame_size)
+                    message = memoryview(slot[0])[:FRAME_HEADER.size + frame_size]
+                    view = np.frombuffer(message, np.uint8, frame_size, FRAME_HEADER.size).reshape(height, width, 3)
+                    ret, frame = self.cap.retrieve(view)
+                    if not ret:
+                        continue
+                    if frame is not view:
+                        np.copyto(view, frame)
+                else:
+                    ret, frame = self.cap.retrieve()
+                    if not ret:
+                        continue
+                    
+                    if frame.ndim == 3:
+                        data = self._encode_jpeg(frame)
+                    elif self.mjpeg_passthrough and frame.size >= 2 and frame.flat[0] == 0xFF and frame.flat[1] == 0xD8:
+                        # ได้ MJPEG จากกล้องมาแล้ว (ขึ้นต้นด้วย JPEG SOI) ส่งต่อได้เลย
+                        data = frame.reshape(-1)
+                    else:
+                        # ไม่ใช่ JPEG (driver ส่ง format อื่นมา) -> ให้ OpenCV แปลงเป็น BGR แล้ว encode เอง
+                        print("⚠️ กล้องไม่ได้ส่ง MJPEG มา เปลี่ยนไป encode JPEG เอง")
+                        self.mjpeg_passthrough = False
+                        self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+                        continue
+                    
+                    slot = self._message_buffer(FRAME_HEADER.size + len(data))
+                    message = memoryview(slot[0])[:FRAME_HEADER.size + len(data)]
+                    message[FRAME_HEADER.size:] = data
                 
-                # สร้าง metadata
-                metadata = {
-                    'timestamp': time.time(),
-                    'frame_count': frame_count,
-                    'width': width,
-                    'height': height
-                }
+                FRAME_HEADER.pack_into(message, 0, time.time(), frame_count, width, height, frame_format)
                 
-                # Publish: metadata + frame data
-                self.socket.send_json(metadata, zmq.SNDMORE)
-                self.socket.send(buffer.tobytes())
+                # Publish แบบ zero-copy: zmq อ่านจาก buffer นี้โดยตรง
+                # tracker บอกว่าส่งเสร็จเมื่อไหร่ ก่อนหน้านั้นห้ามเขียนทับ buffer นี้
+                slot[1] = self.socket.send(message, copy=False, track=True)
                 
                 frame_count += 1
                 
@@ -98,9 +213,6 @@ class CameraService:
                     actual_fps = frame_count / elapsed
                     print(f"[{datetime.now().strftime('%H:%M:%S')}] 📊 Published {frame_count} frames @ {actual_fps:.1f} FPS")
                 
-                # จำกัด FPS
-                time.sleep(1/FPS_TARGET)
-                
         except KeyboardInterrupt:
             print("\n⏹️ หยุดการทำงาน...")
         finally:
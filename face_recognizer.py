@@ -10,9 +10,126 @@ import numpy as np
 import cv2
 from typing import List, Tuple, Optional, Dict
 from dataclasses import dataclass, field
+from functools import lru_cache
+import hashlib
+import json
+import os
 import pickle
 from pathlib import Path
 
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+# Dimension of dlib face encodings
+ENCODING_DIM = 128
+
+
+def _l2_normalize(encodings: np.ndarray) -> np.ndarray:
+    """Scale encodings (last axis) to unit length as float32"""
+    encodings = np.asarray(encodings, dtype=np.float32)
+    norms = np.linalg.norm(encodings, axis=-1, keepdims=True)
+    return encodings / np.maximum(norms, np.float32(1e-12))
+
+
+# Largest int8 code: each quantized vector is scaled so its largest
+# component maps to +-INT8_SCALE (per-vector scale, kept alongside the codes)
+INT8_SCALE = 127
+
+# Don't downscale for detection if the shorter side would drop below this
+# (e.g. small person crops, where HOG would start missing faces)
+MIN_DETECTION_SIDE = 160
+
+
+# Annotation colors (BGR)
+NAMED_FACE_COLOR = (0, 255, 0)
+UNNAMED_FACE_COLOR = (255, 0, 0)
+
+
+@lru_cache(maxsize=256)
+def _label_sprite(label: str, color: Tuple[int, int, int]) -> np.ndarray:
+    """Render a label (white text on a filled background) once and cache it"""
+    (label_w, label_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
+    
+    sprite = np.empty((label_h + 10, label_w, 3), dtype=np.uint8)
+    sprite[:] = color
+    cv2.putText(sprite, label, (0, label_h + 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+    
+    # Shared between calls, so guard against accidental modification
+    sprite.setflags(write=False)
+    return sprite
+
+
+def _database_paths(filepath: str) -> Tuple[Path, Path, Path]:
+    """Encodings (.npy), metadata (.json) and centroids (.centroids.npy) paths for a database name"""
+    path = Path(filepath)
+    return path.with_suffix('.npy'), path.with_suffix('.json'), path.with_suffix('.centroids.npy')
+
+
+def _quantize_int8(encodings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantize float encodings (last axis) to int8 codes and per-vector scales
+    
+    code * scale approximates the encoding; the dot product of two encodings is
+    (int32 dot of their codes) * scale_a * scale_b.
+    """
+    encodings = np.asarray(encodings, dtype=np.float32)
+    scales = np.maximum(np.abs(encodings).max(axis=-1), np.float32(1e-12)) / np.float32(INT8_SCALE)
+    codes = np.round(encodings / scales[..., None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _nearest_earlier_match_numpy(matrix: np.ndarray, max_sq_distance: float) -> np.ndarray:
+    """
+    For each row i, index of the closest row j < i within max_sq_distance (-1 if none)
+    
+    Rows must be unit length. Processed in blocks to bound the N x N memory.
+    """
+    n = len(matrix)
+    nearest = np.full(n, -1, dtype=np.int64)
+    block = 1024
+    
+    for start in range(1, n, block):
+        stop = min(n, start + block)
+        sq_distances = 2.0 - 2.0 * (matrix[start:stop] @ matrix[:stop].T)
+        
+        # Only consider earlier rows (j < i)
+        rows = np.arange(start, stop)[:, None]
+        sq_distances[np.arange(stop)[None, :] >= rows] = np.inf
+        
+        best = np.argmin(sq_distances, axis=1)
+        within = sq_distances[np.arange(stop - start), best] <= max_sq_distance
+        nearest[start:stop][within] = best[within]
+    
+    return nearest
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _nearest_earlier_match(matrix, max_sq_distance):
+        n, dim = matrix.shape
+        nearest = np.full(n, -1, dtype=np.int64)
+        
+        for i in prange(n):
+            best = -1
+            best_d = max_sq_distance
+            for j in range(i):
+                d = 0.0
+                for k in range(dim):
+                    t = matrix[i, k] - matrix[j, k]
+                    d += t * t
+                if d <= best_d:
+                    best_d = d
+                    best = j
+            nearest[i] = best
+        
+        return nearest
+else:
+    _nearest_earlier_match = _nearest_earlier_match_numpy
+
 
 @dataclass
 class FaceData:
@@ -27,7 +144,14 @@ class FaceData:
 class FaceRecognizer:
     """Face detection and recognition using face_recognition library"""
     
-    def __init__(self, tolerance: float = 0.6, model: str = "hog"):
+    def __init__(
+        self,
+        tolerance: float = 0.6,
+        model: str = "hog",
+        quantize: bool = False,
+        detection_scale: float = 0.5,
+        encoding_cache: Optional[str] = None
+    ):
         """
         Initialize face recognizer
         
@@ -35,18 +159,46 @@ class FaceRecognizer:
             tolerance: How much distance between faces to consider it a match (0-1)
                       Lower is more strict. 0.6 is typical best performance.
             model: Face detection model - 'hog' (faster, CPU) or 'cnn' (more accurate, GPU)
+            quantize: Store the matching matrix as int8 (4x smaller, ~0.01 distance
+                      error around the matching tolerance).
+                      Useful for very large databases; float32 is faster in NumPy.
+            detection_scale: Resize factor applied before face detection (1.0 = full size).
+                      Encodings are still computed on the full-resolution image.
+            encoding_cache: Pickle file of face locations/encodings keyed by frame
+                      content. Frames seen before skip detection and encoding;
+                      call save_encoding_cache() to write new entries back.
         """
         self.tolerance = tolerance
         self.model = model
+        self.quantize = quantize
+        self.detection_scale = detection_scale
         
         # Database of known faces
         self.known_face_encodings: List[np.ndarray] = []
         self.known_face_ids: List[int] = []
         self.known_face_names: Dict[int, str] = {}
         
+        # Matching index: one L2-normalized centroid per face ID (running mean of
+        # its samples), so matching is a single (persons x 128) matrix-vector
+        # product. _encoding_matrix is the centroids themselves, or their int8
+        # codes when quantized (with one float32 scale per row in _code_scales).
+        self._index_dtype = np.int8 if quantize else np.float32
+        self._centroids = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        self._centroid_counts = np.empty((0,), dtype=np.int64)
+        self._encoding_matrix = self._centroids
+        self._code_scales = np.empty((0,), dtype=np.float32)
+        self._index_ids: List[int] = []  # face_id of each index row
+        self._index_rows: Dict[int, int] = {}  # face_id -> index row
+        self._num_indexed = 0
+        
         # Counter for assigning new face IDs
         self.next_face_id = 1
         
+        # frame key -> (face_locations, face_encodings)
+        self.encoding_cache_path = Path(encoding_cache) if encoding_cache else None
+        self._encoding_cache: Dict[str, Tuple[list, list]] = self._load_encoding_cache()
+        self._encoding_cache_dirty = False
+        
         print(f"🔧 FaceRecognizer initialized")
         print(f"  - Model: {model}")
         print(f"  - Tolerance: {tolerance}")
@@ -62,17 +214,16 @@ class FaceRecognizer:
         Returns:
             List of FaceData objects containing face information
         """
-        # Convert BGR to RGB (face_recognition uses RGB)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # Detect face locations
-        face_locations = face_recognition.face_locations(rgb_frame, model=self.model)
-        
-        if not face_locations:
-            return []
-        
-        # Get face encodings
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+        if self.encoding_cache_path is None:
+            face_locations, face_encodings = self._encode_frame(frame)
+        else:
+            key = self._frame_key(frame)
+            cached = self._encoding_cache.get(key)
+            if cached is None:
+                cached = self._encode_frame(frame)
+                self._encoding_cache[key] = cached
+                self._encoding_cache_dirty = True
+            face_locations, face_encodings = cached
         
         faces = []
         
@@ -83,9 +234,11 @@ class FaceRecognizer:
             # Try to match with known faces
             face_id, confidence = self._match_face(encoding)
             
-            # If no match found, assign new ID
+            # If no match found, assign new ID; otherwise refine its centroid
             if face_id is None:
                 face_id = self._add_new_face(encoding)
+            else:
+                self._update_centroid(face_id, encoding)
             
             name = self.known_face_names.get(face_id)
             
@@ -99,6 +252,87 @@ class FaceRecognizer:
         
         return faces
     
+    def _encode_frame(self, frame: np.ndarray) -> Tuple[list, list]:
+        """Locate and encode all faces in a BGR frame (the expensive dlib part)"""
+        if self.model == "hog":
+            # HOG uses the strongest gradient across channels, so channel order
+            # doesn't matter: detect on BGR and only convert when faces exist
+            face_locations = self._locate_faces(frame)
+            
+            if not face_locations:
+                return [], []
+            
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        else:
+            # Convert BGR to RGB (face_recognition uses RGB)
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            face_locations = self._locate_faces(rgb_frame)
+            
+            if not face_locations:
+                return [], []
+        
+        # Get face encodings
+        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+        
+        return face_locations, face_encodings
+    
+    def _frame_key(self, frame: np.ndarray) -> str:
+        """Encoding cache key: frame content plus the settings that affect detection"""
+        digest = hashlib.blake2b(np.ascontiguousarray(frame), digest_size=16)
+        digest.update(f"{frame.shape}|{self.model}|{self.detection_scale}".encode())
+        return digest.hexdigest()
+    
+    def _load_encoding_cache(self) -> Dict[str, Tuple[list, list]]:
+        """Read the encoding cache file (empty if disabled, missing or unreadable)"""
+        if self.encoding_cache_path is None or not self.encoding_cache_path.exists():
+            return {}
+        
+        try:
+            with open(self.encoding_cache_path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            print(f"⚠️  Ignoring unreadable encoding cache {self.encoding_cache_path}: {e}")
+            return {}
+    
+    def save_encoding_cache(self):
+        """Write new encoding cache entries to disk (atomic replace)"""
+        if self.encoding_cache_path is None or not self._encoding_cache_dirty:
+            return
+        
+        self.encoding_cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.encoding_cache_path.with_name(f"{self.encoding_cache_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self._encoding_cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.encoding_cache_path)
+        
+        self._encoding_cache_dirty = False
+    
+    def _locate_faces(self, image: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """
+        Run face detection on a downscaled copy and map boxes back to full resolution
+        
+        Returns:
+            List of (top, right, bottom, left) in image coordinates
+        """
+        scale = self.detection_scale
+        height, width = image.shape[:2]
+        
+        if scale >= 1.0 or min(height, width) * scale < MIN_DETECTION_SIDE:
+            return face_recognition.face_locations(image, model=self.model)
+        
+        small_frame = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        small_locations = face_recognition.face_locations(small_frame, model=self.model)
+        
+        return [
+            (
+                max(0, int(top / scale)),
+                min(width, int(right / scale)),
+                min(height, int(bottom / scale)),
+                max(0, int(left / scale))
+            )
+            for top, right, bottom, left in small_locations
+        ]
+    
     def _match_face(self, encoding: np.ndarray) -> Tuple[Optional[int], float]:
         """
         Match a face encoding against known faces
@@ -106,19 +340,26 @@ class FaceRecognizer:
         Returns:
             Tuple of (face_id, confidence) or (None, 0.0) if no match
         """
-        if not self.known_face_encodings:
+        n = self._num_indexed
+        if n == 0:
             return None, 0.0
         
-        # Calculate distances to all known faces
-        distances = face_recognition.face_distance(self.known_face_encodings, encoding)
+        # Cosine similarity to all known faces (rows are unit length)
+        query = _l2_normalize(encoding)
+        if self.quantize:
+            query_codes, query_scale = _quantize_int8(query)
+            dots = np.matmul(self._encoding_matrix[:n], query_codes, dtype=np.int32)
+            scores = dots * (self._code_scales[:n] * query_scale)
+        else:
+            scores = self._encoding_matrix[:n] @ query
         
-        # Find the best match
-        best_match_idx = np.argmin(distances)
-        best_distance = distances[best_match_idx]
+        # Find the best match; for unit vectors ||a - b||^2 = 2 - 2 a.b
+        best_match_idx = int(np.argmax(scores))
+        best_distance = float(np.sqrt(max(2.0 - 2.0 * scores[best_match_idx], 0.0)))
         
         # Check if within tolerance
         if best_distance <= self.tolerance:
-            face_id = self.known_face_ids[best_match_idx]
+            face_id = self._index_ids[best_match_idx]
             confidence = 1.0 - best_distance  # Convert distance to confidence
             return face_id, confidence
         
@@ -131,9 +372,103 @@ class FaceRecognizer:
         
         self.known_face_encodings.append(encoding)
         self.known_face_ids.append(face_id)
+        self._append_to_index(face_id, encoding)
         
         return face_id
     
+    def _append_to_index(self, face_id: int, encoding: np.ndarray):
+        """Add a centroid row for a new face ID, growing capacity geometrically"""
+        n = self._num_indexed
+        
+        if n == len(self._centroids):
+            capacity = max(16, 2 * n)
+            centroids = np.empty((capacity, ENCODING_DIM), dtype=np.float32)
+            counts = np.empty((capacity,), dtype=np.int64)
+            centroids[:n] = self._centroids[:n]
+            counts[:n] = self._centroid_counts[:n]
+            self._centroids = centroids
+            self._centroid_counts = counts
+            
+            if self.quantize:
+                matrix = np.empty((capacity, ENCODING_DIM), dtype=np.int8)
+                scales = np.empty((capacity,), dtype=np.float32)
+                matrix[:n] = self._encoding_matrix[:n]
+                scales[:n] = self._code_scales[:n]
+                self._encoding_matrix = matrix
+                self._code_scales = scales
+            else:
+                self._encoding_matrix = self._centroids
+        
+        self._centroids[n] = _l2_normalize(encoding)
+        self._centroid_counts[n] = 1
+        if self.quantize:
+            self._encoding_matrix[n], self._code_scales[n] = _quantize_int8(self._centroids[n])
+        
+        self._index_ids.append(face_id)
+        self._index_rows[face_id] = n
+        self._num_indexed = n + 1
+    
+    def _update_centroid(self, face_id: int, encoding: np.ndarray):
+        """Fold a matched encoding into its face ID's running-mean centroid"""
+        row = self._index_rows[face_id]
+        count = self._centroid_counts[row]
+        
+        centroid = self._centroids[row] * count + _l2_normalize(encoding)
+        self._centroids[row] = _l2_normalize(centroid)
+        self._centroid_counts[row] = count + 1
+        
+        if self.quantize:
+            self._encoding_matrix[row], self._code_scales[row] = _quantize_int8(self._centroids[row])
+    
+    def _rebuild_index(self, encodings: Optional[np.ndarray] = None):
+        """Rebuild the centroid index from known_face_encodings (or a matrix of them)"""
+        if encodings is None:
+            encodings = self.known_face_encodings
+        matrix = _l2_normalize(np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM))
+        
+        # Average the normalized samples of each face ID
+        face_ids, inverse, counts = np.unique(
+            np.asarray(self.known_face_ids, dtype=np.int64), return_inverse=True, return_counts=True
+        )
+        sums = np.zeros((len(face_ids), ENCODING_DIM), dtype=np.float32)
+        np.add.at(sums, inverse, matrix)
+        
+        self._set_index(face_ids, sums, counts)
+    
+    def _regroup_index(self, id_map: Dict[int, Optional[int]]):
+        """
+        Relabel (or drop, when mapped to None) centroid rows without touching samples
+        
+        Rows that end up with the same face ID are combined as a count-weighted
+        mean, so centroids refined by _update_centroid survive merges.
+        """
+        n = self._num_indexed
+        new_ids = [id_map.get(fid, fid) for fid in self._index_ids]
+        keep = np.array([fid is not None for fid in new_ids], dtype=bool)
+        
+        face_ids, inverse = np.unique(
+            np.array([fid for fid in new_ids if fid is not None], dtype=np.int64), return_inverse=True
+        )
+        counts = self._centroid_counts[:n][keep]
+        sums = np.zeros((len(face_ids), ENCODING_DIM), dtype=np.float32)
+        np.add.at(sums, inverse, self._centroids[:n][keep] * counts[:, None])
+        merged_counts = np.zeros(len(face_ids), dtype=np.int64)
+        np.add.at(merged_counts, inverse, counts)
+        
+        self._set_index(face_ids, sums, merged_counts)
+    
+    def _set_index(self, face_ids: np.ndarray, centroids: np.ndarray, counts: np.ndarray):
+        """Install centroid rows (normalized here) for the given face IDs"""
+        self._centroids = np.ascontiguousarray(_l2_normalize(centroids).reshape(-1, ENCODING_DIM))
+        self._centroid_counts = np.asarray(counts, dtype=np.int64).copy()
+        if self.quantize:
+            self._encoding_matrix, self._code_scales = _quantize_int8(self._centroids)
+        else:
+            self._encoding_matrix = self._centroids
+        self._index_ids = [int(fid) for fid in face_ids]
+        self._index_rows = {fid: row for row, fid in enumerate(self._index_ids)}
+        self._num_indexed = len(self._index_ids)
+    
     def set_face_name(self, face_id: int, name: str):
         """Assign a name to a face ID"""
         self.known_face_names[face_id] = name
@@ -151,41 +486,150 @@ class FaceRecognizer:
             del self.known_face_encodings[idx]
             del self.known_face_ids[idx]
         
+        if face_id_2 in self._index_rows:
+            self._regroup_index({face_id_2: None})
+        
         # Transfer name if exists
         if face_id_2 in self.known_face_names:
             if face_id_1 not in self.known_face_names:
                 self.known_face_names[face_id_1] = self.known_face_names[face_id_2]
             del self.known_face_names[face_id_2]
     
+    def consolidate(self) -> int:
+        """
+        Merge face IDs that turned out to be the same person
+        
+        Every face ID's centroid is compared against all earlier ones; IDs linked
+        by a pair within tolerance are relabeled to the lowest ID of their group.
+        Unlike merge_faces, the encodings of the merged IDs are kept.
+        
+        Returns:
+            Number of face IDs merged away
+        """
+        n = self._num_indexed
+        if n < 2:
+            return 0
+        
+        nearest = _nearest_earlier_match(
+            np.ascontiguousarray(self._centroids[:n]),
+            float(self.tolerance ** 2)
+        )
+        
+        # Union-find over face IDs, keeping the smallest ID as the root
+        parent = {}
+        
+        def find(fid):
+            while parent.get(fid, fid) != fid:
+                fid = parent[fid]
+            return fid
+        
+        for i, j in enumerate(nearest):
+            if j < 0:
+                continue
+            root_a = find(self._index_ids[i])
+            root_b = find(self._index_ids[j])
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+        
+        if not parent:
+            return 0
+        
+        self.known_face_ids = [find(fid) for fid in self.known_face_ids]
+        self._regroup_index({fid: find(fid) for fid in parent})
+        
+        # Transfer names to the surviving IDs
+        for fid in parent:
+            if fid in self.known_face_names:
+                root = find(fid)
+                name = self.known_face_names.pop(fid)
+                self.known_face_names.setdefault(root, name)
+        
+        return len(parent)
+    
     def save_database(self, filepath: str):
-        """Save known faces database to file"""
-        data = {
-            'encodings': self.known_face_encodings,
-            'ids': self.known_face_ids,
-            'names': self.known_face_names,
+        """
+        Save known faces database to file
+        
+        Encodings are written as one float32 (N, 128) matrix (<name>.npy) so they
+        load with a single read; ids/names go to a sidecar <name>.json.
+        The matching centroids (refined by every matched face) and their sample
+        counts go to <name>.centroids.npy and the .json, so loading restores them
+        instead of re-averaging the stored samples.
+        """
+        encodings_path, meta_path, centroids_path = _database_paths(filepath)
+        
+        encodings = np.asarray(self.known_face_encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        np.save(encodings_path, encodings)
+        
+        n = self._num_indexed
+        np.save(centroids_path, self._centroids[:n])
+        
+        meta = {
+            'ids': [int(fid) for fid in self.known_face_ids],
+            'names': {str(fid): name for fid, name in self.known_face_names.items()},
             'next_id': self.next_face_id,
-            'tolerance': self.tolerance
+            'tolerance': self.tolerance,
+            'centroid_ids': list(self._index_ids),
+            'centroid_counts': self._centroid_counts[:n].tolist()
         }
         
-        with open(filepath, 'wb') as f:
-            pickle.dump(data, f)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
         
-        print(f"✓ Face database saved to {filepath}")
+        print(f"✓ Face database saved to {encodings_path} + {meta_path.name}")
     
     def load_database(self, filepath: str):
-        """Load known faces database from file"""
-        if not Path(filepath).exists():
+        """Load known faces database from file (.npy + .json, or a legacy .pkl)"""
+        encodings_path, meta_path, centroids_path = _database_paths(filepath)
+        centroids = None
+        
+        if encodings_path.exists() and meta_path.exists():
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            
+            # Private copy, not a memory map: save_database rewrites this same
+            # file, which fails (Windows) or corrupts live views (POSIX) while mapped
+            encodings = np.load(encodings_path)
+            names = {int(fid): name for fid, name in meta.get('names', {}).items()}
+            ids = meta['ids']
+            next_id = meta['next_id']
+            tolerance = meta.get('tolerance', self.tolerance)
+            
+            # Saved centroids are only usable if they cover exactly the stored IDs
+            # (databases written by train_model have none and are re-averaged)
+            centroid_ids = meta.get('centroid_ids')
+            if (
+                centroid_ids is not None
+                and centroids_path.exists()
+                and set(centroid_ids) == set(ids)
+            ):
+                centroids = np.load(centroids_path)
+                centroid_counts = meta['centroid_counts']
+                if len(centroids) != len(centroid_ids):
+                    centroids = None
+        elif Path(filepath).suffix == '.pkl' and Path(filepath).exists():
+            with open(filepath, 'rb') as f:
+                data = pickle.load(f)
+            
+            encodings = np.asarray(data['encodings'], dtype=np.float32).reshape(-1, ENCODING_DIM)
+            names = data.get('names', {})
+            ids = data['ids']
+            next_id = data['next_id']
+            tolerance = data.get('tolerance', self.tolerance)
+        else:
             print(f"⚠️  Database file not found: {filepath}")
             return False
         
-        with open(filepath, 'rb') as f:
-            data = pickle.load(f)
-        
-        self.known_face_encodings = data['encodings']
-        self.known_face_ids = data['ids']
-        self.known_face_names = data.get('names', {})
-        self.next_face_id = data['next_id']
-        self.tolerance = data.get('tolerance', self.tolerance)
+        # Rows are views into the loaded matrix
+        self.known_face_encodings = list(encodings)
+        self.known_face_ids = list(ids)
+        self.known_face_names = names
+        self.next_face_id = next_id
+        self.tolerance = tolerance
+        if centroids is not None:
+            self._set_index(centroid_ids, centroids, centroid_counts)
+        else:
+            self._rebuild_index(encodings)
         
         print(f"✓ Face database loaded from {filepath}")
         print(f"  - Known faces: {len(self.known_face_encodings)}")
@@ -196,23 +640,42 @@ class FaceRecognizer:
         """Get statistics about known faces"""
         return {
             'total_faces': len(self.known_face_encodings),
+            'total_ids': self._num_indexed,
             'named_faces': len(self.known_face_names),
             'unnamed_faces': len(self.known_face_encodings) - len(self.known_face_names),
             'next_face_id': self.next_face_id
         }
     
-    def draw_faces(self, frame: np.ndarray, faces: List[FaceData]) -> np.ndarray:
-        """Draw face bounding boxes and labels on frame"""
-        annotated = frame.copy()
+    def draw_faces(self, frame: np.ndarray, faces: List[FaceData], inplace: bool = False) -> np.ndarray:
+        """
+        Draw face bounding boxes and labels on frame
+        
+        Args:
+            inplace: Draw directly on frame instead of a copy (when the caller owns it)
+        """
+        annotated = frame if inplace else frame.copy()
         
+        if not faces:
+            return annotated
+        
+        # Draw all rectangles of the same color with one polylines call
+        boxes_by_color: Dict[Tuple[int, int, int], List[np.ndarray]] = {}
         for face in faces:
             x1, y1, x2, y2 = face.bbox
             
             # Choose color based on whether face is named
-            color = (0, 255, 0) if face.name else (255, 0, 0)
-            
-            # Draw rectangle
-            cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 2)
+            color = NAMED_FACE_COLOR if face.name else UNNAMED_FACE_COLOR
+            boxes_by_color.setdefault(color, []).append(
+                np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.int32)
+            )
+        
+        for color, boxes in boxes_by_color.items():
+            cv2.polylines(annotated, boxes, True, color, 2)
+        
+        # Blit pre-rendered label sprites above each box
+        height, width = annotated.shape[:2]
+        for face in faces:
+            x1, y1 = face.bbox[0], face.bbox[1]
             
             # Prepare label
             if face.name:
@@ -223,20 +686,21 @@ class FaceRecognizer:
             if face.confidence > 0:
                 label += f" {face.confidence:.2f}"
             
-            # Draw label background
-            (label_w, label_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-            cv2.rectangle(annotated, (x1, y1 - label_h - 10), (x1 + label_w, y1), color, -1)
+            sprite = _label_sprite(label, NAMED_FACE_COLOR if face.name else UNNAMED_FACE_COLOR)
             
-            # Draw label text
-            cv2.putText(
-                annotated,
-                label,
-                (x1, y1 - 5),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.6,
-                (255, 255, 255),
-                1
-            )
+            # Clip the sprite to the frame (label background sits on top of the box)
+            top = y1 - sprite.shape[0]
+            dst_top, dst_left = max(0, top), max(0, x1)
+            dst_bottom = min(height, top + sprite.shape[0])
+            dst_right = min(width, x1 + sprite.shape[1])
+            
+            if dst_bottom <= dst_top or dst_right <= dst_left:
+                continue
+            
+            annotated[dst_top:dst_bottom, dst_left:dst_right] = sprite[
+                dst_top - top:dst_bottom - top,
+                dst_left - x1:dst_right - x1
+            ]
         
         return annotated
 
@@ -4,22 +4,39 @@ Face Watcher Service
 """
 
 import os
+import sys
 import time
+import json
 import pickle
+import sqlite3
+import threading
+import cv2
+import numpy as np
 import requests
 import face_recognition
 from pathlib import Path
 from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
 # --- ตั้งค่า ---
 WATCH_DIR = "image/IMAGE_002"
 DB_PATH = "test/output/face_database.pkl"
-PROCESSED_FILE = "processed_files.txt"  # เก็บรายชื่อไฟล์ที่ประมวลผลแล้ว
+PROCESSED_FILE = "processed_files.db"  # เก็บรายชื่อไฟล์ที่ประมวลผลแล้ว (sqlite)
+LEGACY_PROCESSED_FILE = "processed_files.txt"  # รูปแบบเก่า (import ครั้งแรกครั้งเดียว)
 ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
 TOLERANCE = 0.6  # ค่า distance ที่ยอมรับ (ยิ่งต่ำยิ่งเข้มงวด)
 MODEL = "hog"
+MAX_WORKERS = os.cpu_count() or 4  # จำนวนรูปที่ประมวลผลพร้อมกันได้
+WRITE_POLL_INTERVAL = 0.05  # วินาที - ความถี่เช็คขนาดไฟล์ระหว่างรอเขียนเสร็จ
+WRITE_TIMEOUT = 5  # วินาที - รอไฟล์เขียนเสร็จนานสุดเท่านี้
+
+# Linux (inotify) แจ้ง event ตอนปิดไฟล์หลังเขียนเสร็จ (IN_CLOSE_WRITE) ได้เลย
+# OS อื่นไม่มี event นี้ ต้องรอจนขนาดไฟล์นิ่งแทน
+CLOSE_EVENTS_SUPPORTED = sys.platform.startswith("linux")
+DETECTION_SCALE = 0.5  # ย่อภาพก่อนหาใบหน้า (HOG เร็วขึ้น ~4 เท่า), encoding ยังใช้ภาพเต็ม
 
 # --- Jarvis Integration ---
 JARVIS_API_URL = "http://localhost:3000/api/trigger"
@@ -42,7 +59,8 @@ class FaceDatabase:
     
     def __init__(self, db_path: str):
         self.db_path = db_path
-        self.encodings = []
+        self.encodings = np.empty((0, 128), dtype=np.float32)
+        self.sq_norms = np.empty((0,), dtype=np.float32)
         self.ids = []
         self.names = {}
         self.tolerance = TOLERANCE
@@ -50,16 +68,32 @@ class FaceDatabase:
     
     def load(self):
         """โหลดฐานข้อมูลจากไฟล์"""
-        if not Path(self.db_path).exists():
+        npy_path = Path(self.db_path).with_suffix('.npy')
+        json_path = Path(self.db_path).with_suffix('.json')
+        
+        if npy_path.exists() and json_path.exists():
+            # รูปแบบปัจจุบัน: encodings (N, 128) float32 ใน .npy + ids/names ใน .json
+            encodings = np.load(npy_path)
+            with open(json_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            ids = meta['ids']
+            names = {int(fid): name for fid, name in meta.get('names', {}).items()}
+        elif Path(self.db_path).exists():
+            # ไฟล์ pickle แบบเก่า
+            with open(self.db_path, 'rb') as f:
+                data = pickle.load(f)
+            encodings = data['encodings']
+            ids = data['ids']
+            names = data['names']
+        else:
             print(f"⚠️  ไม่พบฐานข้อมูลที่ {self.db_path}")
             return False
         
-        with open(self.db_path, 'rb') as f:
-            data = pickle.load(f)
-        
-        self.encodings = data['encodings']
-        self.ids = data['ids']
-        self.names = data['names']
+        # เก็บเป็น matrix float32 ต่อเนื่อง (N, 128) + norm ยกกำลังสอง ไว้คำนวณทีเดียว
+        self.encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, 128)
+        self.sq_norms = np.einsum('ij,ij->i', self.encodings, self.encodings)
+        self.ids = ids
+        self.names = names
         # self.tolerance = data.get('tolerance', TOLERANCE)
         self.tolerance = TOLERANCE  # ใช้ค่าจาก Config ด้านบน (จะได้ปรับจูนง่ายๆ)
         
@@ -72,15 +106,17 @@ class FaceDatabase:
         หาใบหน้าที่ตรงกับ encoding ที่ให้มา
         Returns: (name, distance) หรือ (None, None) ถ้าไม่เจอ
         """
-        if not self.encodings:
+        if len(self.encodings) == 0:
             return None, None
         
-        # คำนวณ distance กับทุก encoding ในฐานข้อมูล
-        distances = face_recognition.face_distance(self.encodings, face_encoding)
+        # คำนวณ distance กับทุก encoding ในฐานข้อมูลด้วย matrix-vector ครั้งเดียว
+        # ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b
+        query = np.asarray(face_encoding, dtype=np.float32)
+        sq_distances = self.sq_norms + query @ query - 2 * (self.encodings @ query)
         
         # หาตัวที่ใกล้ที่สุด
-        best_match_idx = distances.argmin()
-        best_distance = distances[best_match_idx]
+        best_match_idx = int(sq_distances.argmin())
+        best_distance = float(np.sqrt(max(sq_distances[best_match_idx], 0.0)))
         
         # เช็คว่าผ่าน threshold หรือไม่
         if best_distance <= self.tolerance:
@@ -91,39 +127,143 @@ class FaceDatabase:
         return None, best_distance
 
 
+def wait_until_written(filepath: str) -> bool:
+    """
+    รอจนขนาดไฟล์ไม่เปลี่ยนแล้ว (ผู้เขียนเขียนเสร็จ)
+    Returns: False ถ้าไฟล์หายไประหว่างรอ
+    """
+    deadline = time.monotonic() + WRITE_TIMEOUT
+    prev_size = -1
+    
+    while time.monotonic() < deadline:
+        try:
+            size = os.stat(filepath).st_size
+        except FileNotFoundError:
+            return False
+        
+        if size == prev_size and size > 0:
+            return True
+        
+        prev_size = size
+        time.sleep(WRITE_POLL_INTERVAL)
+    
+    return True
+
+
+def locate_faces(image):
+    """หาตำแหน่งใบหน้าบนภาพที่ย่อแล้ว แล้วขยายพิกัดกลับเป็นขนาดจริง"""
+    if DETECTION_SCALE >= 1.0:
+        return face_recognition.face_locations(image, model=MODEL)
+    
+    height, width = image.shape[:2]
+    small = cv2.resize(image, (0, 0), fx=DETECTION_SCALE, fy=DETECTION_SCALE, interpolation=cv2.INTER_AREA)
+    
+    return [
+        (
+            max(0, int(top / DETECTION_SCALE)),
+            min(width, int(right / DETECTION_SCALE)),
+            min(height, int(bottom / DETECTION_SCALE)),
+            max(0, int(left / DETECTION_SCALE))
+        )
+        for top, right, bottom, left in face_recognition.face_locations(small, model=MODEL)
+    ]
+
+
 class ProcessedFiles:
-    """จัดการรายการไฟล์ที่ประมวลผลแล้ว"""
+    """จัดการรายการไฟล์ที่ประมวลผลแล้ว (เก็บใน sqlite)"""
+    
+    CACHE_SIZE = 1024  # จำนวนชื่อไฟล์ล่าสุดที่ cache ไว้ใน memory
     
-    def __init__(self, filepath: str):
+    def __init__(self, filepath: str, legacy_filepath: str | None = None):
         self.filepath = filepath
-        self.processed = set()
+        self._lock = threading.Lock()
+        self._recent = OrderedDict()
+        
+        self._conn = sqlite3.connect(filepath, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS processed (name TEXT PRIMARY KEY)")
+        
+        if legacy_filepath:
+            self.import_legacy(legacy_filepath)
         self.load()
     
     def load(self):
-        """โหลดรายการจากไฟล์"""
-        if Path(self.filepath).exists():
-            with open(self.filepath, 'r', encoding='utf-8') as f:
-                self.processed = set(line.strip() for line in f if line.strip())
-            print(f"📋 โหลดรายการไฟล์ที่ประมวลผลแล้ว: {len(self.processed)} ไฟล์")
+        """แสดงจำนวนไฟล์ที่ประมวลผลแล้ว"""
+        count = self._conn.execute("SELECT COUNT(*) FROM processed").fetchone()[0]
+        if count:
+            print(f"📋 โหลดรายการไฟล์ที่ประมวลผลแล้ว: {count} ไฟล์")
+    
+    def import_legacy(self, legacy_filepath: str):
+        """ย้ายรายการจากไฟล์ .txt แบบเก่าเข้า sqlite (ครั้งเดียว แล้วเปลี่ยนชื่อไฟล์เก่า)"""
+        legacy_path = Path(legacy_filepath)
+        if not legacy_path.exists():
+            return
+        
+        with open(legacy_path, 'r', encoding='utf-8') as f:
+            names = [(line.strip(),) for line in f if line.strip()]
+        
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR IGNORE INTO processed (name) VALUES (?)", names)
+            self._conn.execute("COMMIT")
+        
+        legacy_path.rename(legacy_path.with_name(legacy_path.name + ".imported"))
+        print(f"📋 ย้ายรายการจาก {legacy_filepath} เข้า {self.filepath}: {len(names)} ไฟล์")
     
     def add(self, filename: str):
         """เพิ่มไฟล์เข้ารายการ"""
-        self.processed.add(filename)
-        with open(self.filepath, 'a', encoding='utf-8') as f:
-            f.write(filename + '\n')
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO processed (name) VALUES (?)", (filename,))
+            self._remember(filename)
     
     def is_processed(self, filename: str) -> bool:
         """เช็คว่าประมวลผลไปแล้วหรือยัง"""
-        return filename in self.processed
+        with self._lock:
+            if filename in self._recent:
+                self._recent.move_to_end(filename)
+                return True
+            
+            row = self._conn.execute(
+                "SELECT 1 FROM processed WHERE name = ?", (filename,)
+            ).fetchone()
+            
+            if row is None:
+                return False
+            
+            self._remember(filename)
+            return True
+    
+    def _remember(self, filename: str):
+        """เก็บชื่อไฟล์ไว้ใน cache (LRU) - ต้องถือ lock อยู่"""
+        self._recent[filename] = None
+        self._recent.move_to_end(filename)
+        if len(self._recent) > self.CACHE_SIZE:
+            self._recent.popitem(last=False)
 
 
 class ImageHandler(FileSystemEventHandler):
     """จัดการ Event เมื่อมีไฟล์ใหม่"""
     
-    def __init__(self, db: FaceDatabase, processed: ProcessedFiles):
-        self.db = db
+    def __init__(self, db: FaceDatabase, processed: ProcessedFiles, max_workers: int = MAX_WORKERS):
+        self.db = db  # อ่านอย่างเดียว ใช้ร่วมกันระหว่าง thread ได้
         self.processed = processed
         self.last_greeted = {}  # เก็บเวลาทักทายล่าสุดของแต่ละคน
+        
+        # ประมวลผลหลายรูปพร้อมกัน (watchdog มี thread เดียว ไม่ควรบล็อก)
+        self.max_workers = max_workers
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._in_progress = set()  # ชื่อไฟล์ที่กำลังประมวลผลอยู่
+        self._lock = threading.Lock()
+        self._greet_lock = threading.Lock()
+    
+    def submit(self, filepath: str, wait_for_write: bool = False):
+        """ส่งรูปเข้าคิวประมวลผล"""
+        return self.pool.submit(self.process_image, filepath, wait_for_write)
+    
+    def shutdown(self):
+        """รอให้งานในคิวเสร็จแล้วปิด thread pool"""
+        self.pool.shutdown(wait=True)
     
     def notify_jarvis(self, name: str | None):
         """ส่งการแจ้งเตือนไป Jarvis ให้ทักทาย"""
@@ -134,14 +274,19 @@ class ImageHandler(FileSystemEventHandler):
         display_name = NAME_MAPPING.get(name, name) if name else None
         greeting_key = name if name else "unknown"
         
-        now = time.time()
-        last_time = self.last_greeted.get(greeting_key, 0)
-        
         # เช็ค cooldown - ไม่ทักทายคนเดิมซ้ำเร็วเกินไป
-        if now - last_time < GREETING_COOLDOWN:
-            print(f"   ⏳ ข้าม Jarvis (ทักทาย {display_name or 'unknown'} ไปแล้วเมื่อ {int(now - last_time)} วินาทีก่อน)")
-            return
+        # (จองเวลาไว้ก่อนภายใต้ lock กันหลาย thread ทักคนเดียวกันพร้อมกัน)
+        with self._greet_lock:
+            now = time.time()
+            last_time = self.last_greeted.get(greeting_key, 0)
+            
+            if now - last_time < GREETING_COOLDOWN:
+                print(f"   ⏳ ข้าม Jarvis (ทักทาย {display_name or 'unknown'} ไปแล้วเมื่อ {int(now - last_time)} วินาทีก่อน)")
+                return
+            
+            self.last_greeted[greeting_key] = now
         
+        sent = False
         try:
             # ใช้คำสั่ง wakeAndGreet คำสั่งเดียว
             print(f"   🔔 แจ้งเตือน Jarvis (Wake & Greet)...")
@@ -158,27 +303,42 @@ class ImageHandler(FileSystemEventHandler):
             )
             
             if response.status_code == 200:
-                self.last_greeted[greeting_key] = now
+                sent = True
                 print(f"   🤖 Jarvis: ส่งคำสั่งสำเร็จ!")
             else:
                 print(f"   ⚠️ Jarvis: API error {response.status_code}")
-            
-
                 
         except requests.exceptions.ConnectionError:
             print(f"   ⚠️ Jarvis: ไม่สามารถเชื่อมต่อได้ (Jarvis อาจยังไม่เปิด)")
         except Exception as e:
             print(f"   ⚠️ Jarvis error: {e}")
+        finally:
+            # ส่งไม่สำเร็จ: คืนเวลาเดิม ให้ลองทักใหม่ได้ครั้งหน้า
+            if not sent:
+                with self._greet_lock:
+                    if self.last_greeted.get(greeting_key) == now:
+                        self.last_greeted[greeting_key] = last_time
     
     def on_created(self, event):
         """เมื่อมีไฟล์ใหม่ถูกสร้าง"""
         if event.is_directory:
             return
         
+        # บน Linux รอ on_closed แทน (ไฟล์เขียนเสร็จแน่นอนแล้ว)
+        if CLOSE_EVENTS_SUPPORTED:
+            return
+        
         filepath = event.src_path
-        self.process_image(filepath)
+        self.submit(filepath, wait_for_write=True)
+    
+    def on_closed(self, event):
+        """เมื่อไฟล์ถูกปิดหลังเขียนเสร็จ (inotify IN_CLOSE_WRITE)"""
+        if event.is_directory:
+            return
+        
+        self.submit(event.src_path)
     
-    def process_image(self, filepath: str):
+    def process_image(self, filepath: str, wait_for_write: bool = False):
         """ประมวลผลรูปภาพ"""
         filename = os.path.basename(filepath)
         ext = Path(filepath).suffix.lower()
@@ -187,12 +347,27 @@ class ImageHandler(FileSystemEventHandler):
         if ext not in ALLOWED_EXTENSIONS:
             return
         
-        # เช็คว่าประมวลผลไปแล้วหรือยัง
-        if self.processed.is_processed(filename):
-            return
+        # กันไฟล์เดียวกันถูกประมวลผลซ้อนกันใน 2 thread
+        with self._lock:
+            if filename in self._in_progress:
+                return
+            self._in_progress.add(filename)
         
+        try:
+            # เช็คว่าประมวลผลไปแล้วหรือยัง
+            if self.processed.is_processed(filename):
+                return
+            
+            self._process_claimed_image(filepath, filename, wait_for_write)
+        finally:
+            with self._lock:
+                self._in_progress.discard(filename)
+    
+    def _process_claimed_image(self, filepath: str, filename: str, wait_for_write: bool):
+        """ประมวลผลรูปที่จองไว้แล้ว"""
         # รอให้ไฟล์เขียนเสร็จ (ESP32 อาจส่งมาช้า)
-        time.sleep(0.5)
+        if wait_for_write and not wait_until_written(filepath):
+            return
         
         try:
             now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -200,7 +375,7 @@ class ImageHandler(FileSystemEventHandler):
             
             # โหลดรูปและหาใบหน้า
             image = face_recognition.load_image_file(filepath)
-            face_locations = face_recognition.face_locations(image, model=MODEL)
+            face_locations = locate_faces(image)
             
             if not face_locations:
                 print(f"   ❌ ไม่พบใบหน้าในรูป")
@@ -244,10 +419,10 @@ def scan_existing_files(watch_dir: str, handler: ImageHandler):
     count = 0
     for ext in ALLOWED_EXTENSIONS:
         for filepath in watch_path.glob(f"*{ext}"):
-            handler.process_image(str(filepath))
+            handler.submit(str(filepath))
             count += 1
     
-    print(f"✅ สแกนเสร็จสิ้น: {count} ไฟล์")
+    print(f"✅ สแกนเสร็จสิ้น: {count} ไฟล์ (ประมวลผลพร้อมกัน {handler.max_workers} งาน)")
 
 
 def main():
@@ -259,7 +434,7 @@ def main():
     db = FaceDatabase(DB_PATH)
     
     # โหลดรายการไฟล์ที่ประมวลผลแล้ว
-    processed = ProcessedFiles(PROCESSED_FILE)
+    processed = ProcessedFiles(PROCESSED_FILE, legacy_filepath=LEGACY_PROCESSED_FILE)
     
     # สร้าง Event Handler
     handler = ImageHandler(db, processed)
@@ -287,6 +462,7 @@ def main():
         observer.stop()
     
     observer.join()
+    handler.shutdown()
     print("👋 Goodbye!")
 
 
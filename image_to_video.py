@@ -3,14 +3,156 @@ Image to Video Converter Module
 Convert sequence of images with timestamps to video file
 """
 
+import os
 import cv2
 import numpy as np
+from collections import deque
+from itertools import chain
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, List
+from typing import Iterator, Optional, List, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Images decoded ahead of the encoder in create_video_from_images
+PREFETCH_WORKERS = 4
+PREFETCH_FRAMES = 16
+
+# Codec tried first when hardware encoding is requested (NVENC/QSV/VA-API
+# encoders are only available for H.264/HEVC, not mp4v)
+HW_CODEC = "avc1"
+
+# Encoder options for OpenCV's FFmpeg writer: all cores, fastest x264 preset.
+# Options an encoder doesn't know are ignored; an existing env value wins.
+# Only applied while open_video_writer creates its writers.
+FFMPEG_WRITER_OPTIONS = "threads;0|preset;ultrafast|crf;23"
+FFMPEG_WRITER_OPTIONS_ENV = "OPENCV_FFMPEG_WRITER_OPTIONS"
+
+
+def open_video_capture(video_path: str, hw_accel: bool = True) -> cv2.VideoCapture:
+    """
+    Open a video file, decoding on the GPU (NVDEC/QSV/VA-API) when available.
+    
+    OpenCV silently falls back to software decoding if no hardware decoder
+    can be used, so this never fails where plain cv2.VideoCapture would work.
+    """
+    if hw_accel:
+        cap = cv2.VideoCapture(
+            str(video_path),
+            cv2.CAP_FFMPEG,
+            [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        )
+        if cap.isOpened():
+            return cap
+        cap.release()
+    
+    return cv2.VideoCapture(str(video_path))
+
+
+def open_video_writer(
+    output_path: str,
+    fps: float,
+    frame_size: Tuple[int, int],
+    codec: str = "mp4v",
+    hw_accel: bool = True
+) -> cv2.VideoWriter:
+    """
+    Create a video writer, preferring a hardware H.264 encoder (NVENC etc.).
+    
+    Falls back to the software `codec` writer when hardware encoding is not
+    available (no GPU, or an OpenCV build without the encoder). With
+    VIDEO_ACCELERATION_ANY OpenCV may open a software encoder instead, so
+    the writer is only kept if it reports an actual hardware backend.
+    
+    FFMPEG_WRITER_OPTIONS are set for these writers only (OpenCV reads them
+    from the environment when a writer is opened); the previous environment
+    is restored afterwards.
+    """
+    previous_options = os.environ.get(FFMPEG_WRITER_OPTIONS_ENV)
+    if previous_options is None:
+        os.environ[FFMPEG_WRITER_OPTIONS_ENV] = FFMPEG_WRITER_OPTIONS
+    try:
+        return _open_video_writer(output_path, fps, frame_size, codec, hw_accel)
+    finally:
+        if previous_options is None:
+            os.environ.pop(FFMPEG_WRITER_OPTIONS_ENV, None)
+
+
+def _open_video_writer(
+    output_path: str,
+    fps: float,
+    frame_size: Tuple[int, int],
+    codec: str,
+    hw_accel: bool
+) -> cv2.VideoWriter:
+    """open_video_writer without the environment handling"""
+    if hw_accel:
+        writer = cv2.VideoWriter(
+            str(output_path),
+            cv2.CAP_FFMPEG,
+            cv2.VideoWriter_fourcc(*HW_CODEC),
+            fps,
+            frame_size,
+            [cv2.VIDEOWRITER_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        )
+        if writer.isOpened():
+            acceleration = int(writer.get(cv2.VIDEOWRITER_PROP_HW_ACCELERATION))
+            if acceleration not in (cv2.VIDEO_ACCELERATION_NONE, cv2.VIDEO_ACCELERATION_ANY):
+                logger.info(f"Using hardware-accelerated {HW_CODEC} encoder")
+                return writer
+        writer.release()
+        logger.info(f"Hardware encoder unavailable, falling back to {codec}")
+    
+    return cv2.VideoWriter(
+        str(output_path),
+        cv2.CAP_FFMPEG,
+        cv2.VideoWriter_fourcc(*codec),
+        fps,
+        frame_size
+    )
+
+
+def prefetch_images(
+    image_files: List[Path],
+    workers: int = PREFETCH_WORKERS,
+    ahead: int = PREFETCH_FRAMES
+) -> Iterator[Tuple[Path, Optional[np.ndarray]]]:
+    """
+    Yield (path, image) in order while decoding up to `ahead` images in
+    background threads (cv2.imread releases the GIL).
+    
+    Unreadable images are yielded as None, like cv2.imread.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        files = iter(image_files)
+        
+        for image_file in files:
+            pending.append((image_file, pool.submit(cv2.imread, str(image_file))))
+            if len(pending) >= ahead:
+                break
+        
+        while pending:
+            image_file, future = pending.popleft()
+            # Keep the window full before blocking on the oldest frame
+            next_file = next(files, None)
+            if next_file is not None:
+                pending.append((next_file, pool.submit(cv2.imread, str(next_file))))
+            yield image_file, future.result()
+
+
+def latest_image_mtime(image_dir: Path) -> float:
+    """Newest modification time of the .jpg files in a directory (0 if none)"""
+    latest = 0.0
+    with os.scandir(image_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".jpg"):
+                latest = max(latest, entry.stat().st_mtime)
+    return latest
+
+
 def calculate_fps_from_timestamps(timestamp_list: List[int]) -> float:
     """
     Calculate FPS from timestamp differences.
@@ -24,14 +166,11 @@ def calculate_fps_from_timestamps(timestamp_list: List[int]) -> float:
     if len(timestamp_list) < 2:
         return 30.0  # Default FPS
     
-    # Calculate differences between consecutive timestamps (in seconds)
-    diffs = []
-    for i in range(1, len(timestamp_list)):
-        dt = (timestamp_list[i] - timestamp_list[i-1]) / 1000.0  # Convert ms to seconds
-        if dt > 0:  # Only positive differences
-            diffs.append(dt)
+    # Differences between consecutive timestamps, positive ones only (in seconds)
+    diffs = np.diff(np.asarray(timestamp_list, dtype=np.int64))
+    diffs = diffs[diffs > 0] / 1000.0  # Convert ms to seconds
     
-    if not diffs:
+    if diffs.size == 0:
         return 30.0
     
     # Use median to avoid outliers
@@ -55,17 +194,22 @@ def get_sorted_images(image_dir: Path) -> tuple[List[Path], List[int]]:
     Returns:
         Tuple of (sorted file paths, timestamps)
     """
-    image_files = sorted(image_dir.glob("*.jpg"))
-    
-    # Extract timestamps from filenames
-    timestamps = []
-    for file in image_files:
-        try:
-            ts = int(file.stem)  # Filename without extension
-            timestamps.append(ts)
-        except ValueError:
-            logger.warning(f"Skipping file with invalid timestamp: {file.name}")
-            continue
+    # One directory pass; scandir yields names without a stat() per entry
+    pairs = []
+    with os.scandir(image_dir) as entries:
+        for entry in entries:
+            name = entry.name
+            if not name.endswith(".jpg"):
+                continue
+            try:
+                pairs.append((int(name[:-4]), name))  # Filename without extension
+            except ValueError:
+                logger.warning(f"Skipping file with invalid timestamp: {name}")
+    
+    # Sort numerically so timestamps of different lengths stay in order
+    pairs.sort(key=itemgetter(0))
+    timestamps = [ts for ts, _ in pairs]
+    image_files = [image_dir / name for _, name in pairs]
     
     logger.info(f"Found {len(image_files)} images in {image_dir.name}")
     return image_files, timestamps
@@ -76,7 +220,8 @@ def create_video_from_images(
     output_path: Path,
     auto_fps: bool = True,
     fps: float = 30.0,
-    codec: str = "mp4v"
+    codec: str = "mp4v",
+    hw_accel: bool = True
 ) -> bool:
     """
     Create video from sequence of images.
@@ -86,7 +231,8 @@ def create_video_from_images(
         output_path: Path for output video file
         auto_fps: Whether to calculate FPS from timestamps
         fps: Fixed FPS if auto_fps is False (default: 30.0)
-        codec: Video codec (default: "mp4v" for H.264)
+        codec: Software fallback codec (default: "mp4v", MPEG-4 Part 2)
+        hw_accel: Try a hardware H.264 encoder first, falling back to `codec`
         
     Returns:
         True if successful, False otherwise
@@ -115,12 +261,12 @@ def create_video_from_images(
             logger.info(f"Using fixed FPS: {video_fps}")
         
         # Create video writer
-        fourcc = cv2.VideoWriter_fourcc(*codec)
-        out = cv2.VideoWriter(
+        out = open_video_writer(
             str(output_path),
-            fourcc,
             video_fps,
-            (width, height)
+            (width, height),
+            codec=codec,
+            hw_accel=hw_accel
         )
         
         if not out.isOpened():
@@ -129,15 +275,23 @@ def create_video_from_images(
         
         # Write frames
         logger.info("Writing frames to video...")
-        for i, image_file in enumerate(image_files):
-            frame = cv2.imread(str(image_file))
+        # The first frame is already decoded; only prefetch the rest
+        frames = chain([(image_files[0], first_frame)], prefetch_images(image_files[1:]))
+        
+        for i, (image_file, frame) in enumerate(frames):
             if frame is None:
                 logger.warning(f"Skipping unreadable frame: {image_file.name}")
                 continue
             
-            # Resize if necessary
-            if frame.shape[:2] != (height, width):
-                frame = cv2.resize(frame, (width, height))
+            # Resize if necessary (area averaging when shrinking)
+            frame_height, frame_width = frame.shape[:2]
+            if (frame_height, frame_width) != (height, width):
+                shrinking = frame_width * frame_height > width * height
+                frame = cv2.resize(
+                    frame,
+                    (width, height),
+                    interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR
+                )
             
             out.write(frame)
             
@@ -165,17 +319,22 @@ def create_video_from_device_folder(
     base_image_dir: str = "image",
     output_dir: str = "output",
     auto_fps: bool = True,
-    fps: float = 30.0
+    fps: float = 30.0,
+    force: bool = False
 ) -> Optional[Path]:
     """
     Create video from device-specific image folder.
     
+    The video is only re-encoded when an image is newer than the existing
+    output file (or `force` is set).
+    
     Args:
         device_id: Device ID (e.g., "IMAGE_001")
         base_image_dir: Base directory containing device folders
         output_dir: Directory for output video
         auto_fps: Whether to calculate FPS from timestamps
         fps: Fixed FPS if auto_fps is False
+        force: Re-encode even if the video is up to date
         
     Returns:
         Path to created video, or None if failed
@@ -191,7 +350,13 @@ def create_video_from_device_folder(
     output_path.mkdir(parents=True, exist_ok=True)
     
     # Generate output filename
-    video_file = output_path / f"{device_id}_{video_file.suffix or 'video'}.mp4"
+    video_file = output_path / f"{device_id}_video.mp4"
+    
+    # Skip re-encoding when no image changed since the last run
+    if not force and video_file.exists():
+        if video_file.stat().st_mtime >= latest_image_mtime(image_dir):
+            logger.info(f"Video is up to date, skipping: {video_file}")
+            return video_file
     
     logger.info(f"Creating video for device: {device_id}")
     
@@ -0,0 +1,64 @@
+"""
+Jarvis Client - ส่งคำสั่งไป Jarvis API แบบไม่บล็อก
+ให้ loop เรียลไทม์ (เสียง/ภาพ) แค่โยนงานเข้าคิว แล้ว thread เบื้องหลังเป็นคน POST
+
+- ใช้ requests.Session เดียว (reuse TCP connection ไม่ต้อง handshake ใหม่ทุกครั้ง)
+- คิวจำกัดขนาด ถ้าเต็ม (Jarvis ตอบช้า/ล่ม) จะทิ้งคำสั่งใหม่แทนการรอ
+"""
+
+import queue
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- ตั้งค่า ---
+QUEUE_SIZE = 4  # จำนวนคำสั่งที่รอส่งได้สูงสุด
+JSON_HEADERS = {"Content-Type": "application/json; charset=utf-8"}
+
+
+class JarvisClient:
+    """POST คำสั่งไป Jarvis จาก background thread"""
+    def __init__(self, url: str, timeout: float = 2, queue_size: int = QUEUE_SIZE):
+        self.url = url
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._worker = threading.Thread(target=self._run, name="jarvis-client", daemon=True)
+        self._worker.start()
+
+    def send(self, payload, on_done=None) -> bool:
+        """
+        โยนคำสั่งเข้าคิว (ไม่รอผล)
+        payload เป็น dict หรือ JSON ที่ encode เป็น bytes ไว้แล้ว (ส่งได้เลยไม่ต้อง json.dumps ซ้ำ)
+        on_done(response, error) จะถูกเรียกจาก background thread เมื่อส่งเสร็จ
+        คืนค่า False ถ้าคิวเต็มและคำสั่งนี้ถูกทิ้ง
+        """
+        try:
+            self._queue.put_nowait((payload, on_done))
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self):
+        while True:
+            payload, on_done = self._queue.get()
+            response, error = None, None
+            try:
+                if isinstance(payload, bytes):
+                    response = self.session.post(self.url, data=payload, headers=JSON_HEADERS, timeout=self.timeout)
+                else:
+                    response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            except Exception as e:
+                error = e
+
+            if on_done is not None:
+                try:
+                    on_done(response, error)
+                except Exception:
+                    pass  # callback พังต้องไม่ทำให้ thread ส่งคำสั่งตาย
@@ -1,5 +1,6 @@
 from fastapi import FastAPI, Request, Header, UploadFile, File
 from fastapi.responses import JSONResponse
+import anyio
 import uvicorn
 import os
 from datetime import datetime
@@ -11,6 +12,41 @@ app = FastAPI()
 SAVE_DIR = os.path.join("image", "IMAGE_001")
 os.makedirs(SAVE_DIR, exist_ok=True)
 
+# ขนาด chunk ที่อ่านจาก upload ต่อครั้ง (ไม่ต้องเก็บทั้งไฟล์ไว้ใน memory)
+CHUNK_SIZE = 64 * 1024
+
+# รวม chunk เล็กๆ ให้ได้ขนาดนี้ก่อนเขียนลงดิสก์ 1 ครั้ง (ลดจำนวน write + thread hop)
+WRITE_BATCH_SIZE = 1024 * 1024
+
+
+async def save_chunks(chunks, file_path: str) -> int:
+    """
+    เขียน async iterator ของ bytes ลงไฟล์ โดยรวม chunk ก่อนเขียนทีละ WRITE_BATCH_SIZE
+    คืนค่าจำนวน bytes ที่เขียนทั้งหมด
+    """
+    total_bytes = 0
+    pending = bytearray()
+    
+    # anyio.open_file เขียนใน worker thread จึงไม่ block event loop
+    async with await anyio.open_file(file_path, "wb") as buffer:
+        async for chunk in chunks:
+            pending += chunk
+            total_bytes += len(chunk)
+            if len(pending) >= WRITE_BATCH_SIZE:
+                await buffer.write(bytes(pending))
+                pending.clear()
+        
+        if pending:
+            await buffer.write(bytes(pending))
+    
+    return total_bytes
+
+
+async def read_upload_chunks(file: UploadFile):
+    """อ่าน UploadFile ทีละ CHUNK_SIZE"""
+    while chunk := await file.read(CHUNK_SIZE):
+        yield chunk
+
 # --- ฟังก์ชันหลักสำหรับอัปโหลด ---
 
 @app.post("/upload_binary")
@@ -20,13 +56,7 @@ async def upload_image(
     x_file_name: str = Header(None) 
 ):
     try:
-        # 1. อ่านข้อมูล Raw Bytes จาก Body
-        file_bytes = await request.body()
-        
-        if not file_bytes:
-            return JSONResponse({"status": "error", "message": "No file data received"}, status_code=400)
-
-        # 2. กำหนดชื่อไฟล์
+        # 1. กำหนดชื่อไฟล์
         if x_file_name:
             # ใช้ชื่อไฟล์ที่ส่งมาจาก Header
             # ใช้ os.path.basename เพื่อป้องกัน Path Traversal
@@ -46,11 +76,14 @@ async def upload_image(
 
         file_path = os.path.join(current_save_dir, filename)
 
-        # 3. บันทึกไฟล์
-        with open(file_path, "wb") as buffer:
-            buffer.write(file_bytes)
+        # 2. Stream ข้อมูล Raw Bytes จาก Body ลงไฟล์
+        total_bytes = await save_chunks(request.stream(), file_path)
+        
+        if total_bytes == 0:
+            os.remove(file_path)
+            return JSONResponse({"status": "error", "message": "No file data received"}, status_code=400)
 
-        # 4. ตอบกลับสำเร็จ
+        # 3. ตอบกลับสำเร็จ
         return JSONResponse({"status": "ok", "file_saved": filename})
     
     except Exception as e:
@@ -73,10 +106,8 @@ async def upload_image_form_data(
              
         file_path = os.path.join(current_save_dir, filename)
         
-        # บันทึกไฟล์
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        # บันทึกไฟล์ทีละ chunk
+        await save_chunks(read_upload_chunks(file), file_path)
             
         return JSONResponse({"status": "ok", "file_saved": filename})
     except Exception as e:
@@ -0,0 +1,51 @@
+"""
+แปลงฐานข้อมูลใบหน้าแบบเก่า (pickle) เป็นรูปแบบปัจจุบัน
+- encodings -> .npy (matrix float32 (N, 128) ก้อนเดียว โหลดแบบ memory-map ได้)
+- ids/names/next_id/tolerance -> .json
+
+รันครั้งเดียวกับไฟล์ .pkl ที่ train ไว้ก่อนเปลี่ยนรูปแบบ จะได้ไม่ต้อง train ใหม่
+หลังแปลงแล้ว service ทุกตัวจะโหลดจาก .npy + .json เอง (ไม่ต้อง unpickle อีก)
+"""
+
+import sys
+import json
+import pickle
+import numpy as np
+from pathlib import Path
+
+# --- ตั้งค่า ---
+DB_PATH = "test/output/face_database.pkl"
+
+def migrate(db_path=DB_PATH):
+    db_path = Path(db_path)
+    encodings_path = db_path.with_suffix('.npy')
+    meta_path = db_path.with_suffix('.json')
+
+    if not db_path.exists():
+        print(f"❌ ไม่พบไฟล์ที่: {db_path}")
+        return False
+
+    with open(db_path, 'rb') as f:
+        data = pickle.load(f)
+
+    encodings = np.asarray(data['encodings'], dtype=np.float32).reshape(-1, 128)
+    ids = [int(fid) for fid in data['ids']]
+    names = data.get('names', {})
+    meta = {
+        'ids': ids,
+        'names': {str(fid): name for fid, name in names.items()},
+        'next_id': data.get('next_id', max(names, default=0) + 1),
+        'tolerance': data.get('tolerance', 0.6)
+    }
+
+    np.save(encodings_path, encodings)
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ แปลง {db_path} -> {encodings_path} + {meta_path.name} เสร็จสิ้น")
+    print(f"   จำนวน ID ทั้งหมด: {len(names)}")
+    print(f"   จำนวนตัวอย่างใบหน้าทั้งหมด: {len(ids)}")
+    return True
+
+if __name__ == "__main__":
+    migrate(sys.argv[1] if len(sys.argv) > 1 else DB_PATH)
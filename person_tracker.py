@@ -6,13 +6,17 @@ Each detected person gets a unique ID that persists across frames.
 Optional face recognition can be enabled to maintain identity across re-entries.
 """
 
+import time
 import cv2
 import numpy as np
+import torch
 from ultralytics import YOLO
 import supervision as sv
 from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from image_to_video import open_video_capture, open_video_writer
 
 try:
     from face_recognizer import FaceRecognizer, FaceData
@@ -22,17 +26,87 @@ except ImportError:
     FaceRecognizer = None
     FaceData = None
 
+try:
+    import dlib
+    DLIB_CUDA_AVAILABLE = bool(dlib.DLIB_USE_CUDA)
+except (ImportError, AttributeError):
+    DLIB_CUDA_AVAILABLE = False
+
+
+# Number of recent bounding boxes kept per person
+BBOX_HISTORY_SIZE = 30
+
+# YOLOv8 input geometry (matches ultralytics' default letterbox)
+INFERENCE_SIZE = 640
+LETTERBOX_STRIDE = 32
+LETTERBOX_FILL = 114
+
+# Wall-clock time matching a monotonic reading, for reporting timestamps
+_WALL_CLOCK_ANCHOR = datetime.now()
+_MONOTONIC_ANCHOR_NS = time.monotonic_ns()
+
+
+def _assign_faces(distances: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    One-to-one (person, face) assignment from a (persons, faces) distance matrix
+    
+    Pairs are taken greedily in order of increasing distance, so each person
+    gets at most one face and each face at most one person. Infinite
+    distances are never assigned.
+    """
+    rows, cols = np.nonzero(np.isfinite(distances))
+    order = np.argsort(distances[rows, cols], kind='stable')
+    
+    used_persons = set()
+    used_faces = set()
+    pairs = []
+    for person_idx, face_idx in zip(rows[order].tolist(), cols[order].tolist()):
+        if person_idx in used_persons or face_idx in used_faces:
+            continue
+        used_persons.add(person_idx)
+        used_faces.add(face_idx)
+        pairs.append((person_idx, face_idx))
+    return pairs
+
+
+def _monotonic_to_datetime(timestamp_ns: int) -> datetime:
+    """Convert a time.monotonic_ns() reading to wall-clock datetime"""
+    return _WALL_CLOCK_ANCHOR + timedelta(microseconds=(timestamp_ns - _MONOTONIC_ANCHOR_NS) / 1000)
+
 
 @dataclass
 class PersonInfo:
     """Information about a tracked person"""
     track_id: int
-    first_seen: datetime = field(default_factory=datetime.now)
-    last_seen: datetime = field(default_factory=datetime.now)
+    # time.monotonic_ns() readings; converted to datetime only for reports
+    first_seen_ns: int = field(default_factory=time.monotonic_ns)
+    last_seen_ns: int = field(default_factory=time.monotonic_ns)
     total_frames: int = 0
-    bbox_history: List[Tuple[int, int, int, int]] = field(default_factory=list)
+    # Ring buffer of recent (x1, y1, x2, y2) boxes; see add_bbox/recent_bboxes
+    bbox_history: np.ndarray = field(
+        default_factory=lambda: np.zeros((BBOX_HISTORY_SIZE, 4), dtype=np.int32)
+    )
+    bbox_head: int = 0  # Next slot to write
+    bbox_count: int = 0  # Number of valid boxes
     face_id: Optional[int] = None  # Face recognition ID
     unique_id: Optional[int] = None  # Unique person ID (merged from face+track)
+    
+    @property
+    def duration(self) -> float:
+        """Seconds between first and last sighting"""
+        return (self.last_seen_ns - self.first_seen_ns) * 1e-9
+    
+    def add_bbox(self, bbox):
+        """Record a bounding box, overwriting the oldest when full"""
+        self.bbox_history[self.bbox_head] = bbox
+        self.bbox_head = (self.bbox_head + 1) % BBOX_HISTORY_SIZE
+        self.bbox_count = min(self.bbox_count + 1, BBOX_HISTORY_SIZE)
+    
+    def recent_bboxes(self) -> np.ndarray:
+        """Recorded bounding boxes, oldest first"""
+        if self.bbox_count < BBOX_HISTORY_SIZE:
+            return self.bbox_history[:self.bbox_count]
+        return np.roll(self.bbox_history, -self.bbox_head, axis=0)
 
 
 class PersonTracker:
@@ -43,7 +117,9 @@ class PersonTracker:
         model_path: str = "yolov8n.pt", 
         confidence: float = 0.5,
         use_face_recognition: bool = False,
-        face_tolerance: float = 0.6
+        face_tolerance: float = 0.6,
+        face_recognize_every: int = 5,
+        face_encoding_cache: Optional[str] = None
     ):
         """
         Initialize the person tracker
@@ -53,12 +129,22 @@ class PersonTracker:
             confidence: Minimum confidence threshold for detection (0-1)
             use_face_recognition: Enable face recognition for person re-identification
             face_tolerance: Face matching tolerance (0-1, lower is stricter)
+            face_recognize_every: Run face recognition on every N-th frame only
+                                  (face IDs stay attached to their track in between)
+            face_encoding_cache: Optional pickle file caching face encodings per
+                                 frame (see FaceRecognizer)
         """
         print(f"🔧 Initializing PersonTracker...")
         
         # Initialize YOLOv8 model
         self.model = YOLO(model_path)
         self.confidence = confidence
+        self.device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+        
+        # Letterbox geometry and input buffer, reused while the frame size is constant
+        self._input_shape: Optional[Tuple[int, int]] = None
+        self._input_buffer: Optional[torch.Tensor] = None
+        self._letterbox: Optional[Tuple[int, int, int, int, float]] = None
         
         # Initialize ByteTrack tracker from supervision
         self.tracker = sv.ByteTrack()
@@ -80,11 +166,21 @@ class PersonTracker:
                 print("    Install: pip install face-recognition")
                 self.use_face_recognition = False
             else:
-                self.face_recognizer = FaceRecognizer(tolerance=face_tolerance, model="hog")
-                print("✓ Face recognition enabled")
+                # dlib's CNN detector is faster than HOG when dlib was built with CUDA
+                face_model = "cnn" if DLIB_CUDA_AVAILABLE else "hog"
+                self.face_recognizer = FaceRecognizer(
+                    tolerance=face_tolerance,
+                    model=face_model,
+                    encoding_cache=face_encoding_cache
+                )
+                print(f"✓ Face recognition enabled ({face_model})")
+        
+        self.face_recognize_every = max(1, face_recognize_every)
+        self._face_frame_idx = 0
         
         # Track ID mappings for merging
         self.track_id_to_unique_id: Dict[int, int] = {}
+        self.face_id_to_track_id: Dict[int, int] = {}
         self.next_unique_id = 1
         
         print(f"✓ PersonTracker initialized")
@@ -93,22 +189,130 @@ class PersonTracker:
         print(f"  - Tracker: ByteTrack")
         print(f"  - Face recognition: {'Enabled' if self.use_face_recognition else 'Disabled'}\n")
     
-    def detect_and_track(self, frame: np.ndarray) -> Tuple[sv.Detections, np.ndarray]:
+    def detect_and_track(
+        self,
+        frame: np.ndarray,
+        inplace: bool = False,
+        annotate: bool = True
+    ) -> Tuple[sv.Detections, Optional[np.ndarray]]:
         """
         Detect and track persons in a single frame
         
         Args:
             frame: Input image/frame (BGR format)
+            inplace: Draw annotations directly on `frame` instead of a copy
+            annotate: Draw boxes/labels; when False the annotated frame is None
             
         Returns:
             Tuple of (detections with tracking IDs, annotated frame)
         """
-        # Run YOLOv8 detection
-        results = self.model(frame, conf=self.confidence, classes=[0], verbose=False)[0]
+        return self.detect_and_track_batch([frame], inplace=inplace, annotate=annotate)[0]
+    
+    def detect_and_track_batch(
+        self,
+        frames: List[np.ndarray],
+        inplace: bool = False,
+        annotate: bool = True
+    ) -> List[Tuple[sv.Detections, Optional[np.ndarray]]]:
+        """
+        Detect persons in several consecutive frames with one YOLOv8 call,
+        then track them frame by frame
         
+        Args:
+            frames: Consecutive frames (BGR format), oldest first
+            inplace: Draw annotations directly on the frames instead of copies
+            annotate: Draw boxes/labels; when False the annotated frames are None
+            
+        Returns:
+            List of (detections with tracking IDs, annotated frame), one per frame
+        """
+        if not frames:
+            return []
+        
+        # Run YOLOv8 detection, letterboxing into the reused buffer when possible
+        if all(frame.shape == frames[0].shape for frame in frames):
+            source = self._preprocess(frames)
+            letterbox = self._letterbox
+        else:
+            source = frames
+            letterbox = None
+        
+        results_list = self.model(source, conf=self.confidence, classes=[0], device=self.device, verbose=False)
+        
+        # Tracker state depends on frame order, so update it sequentially
+        return [
+            self._track_result(frame, results, letterbox, inplace, annotate)
+            for frame, results in zip(frames, results_list)
+        ]
+    
+    def _preprocess(self, frames: List[np.ndarray]) -> torch.Tensor:
+        """
+        Letterbox same-sized BGR frames into a preallocated uint8 buffer and
+        return the normalized RGB (N, 3, H, W) tensor on the inference device
+        """
+        height, width = frames[0].shape[:2]
+        
+        if self._input_shape != (height, width) or self._input_buffer.shape[0] < len(frames):
+            self._allocate_input(height, width, len(frames))
+        
+        top, left, new_height, new_width, _ = self._letterbox
+        host = self._input_buffer[:len(frames)]
+        host_array = host.numpy()
+        
+        # Padding was filled once at allocation; only the image area changes
+        for i, frame in enumerate(frames):
+            if (new_height, new_width) == (height, width):
+                host_array[i, top:top + new_height, left:left + new_width] = frame
+            else:
+                host_array[i, top:top + new_height, left:left + new_width] = cv2.resize(
+                    frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR
+                )
+        
+        # Upload as uint8, then reorder and normalize on the device
+        tensor = host.to(self.device, non_blocking=True)
+        return tensor.permute(0, 3, 1, 2).flip(1).float().div_(255)
+    
+    def _allocate_input(self, height: int, width: int, batch_size: int):
+        """Compute letterbox geometry for a frame size and allocate the input buffer"""
+        scale = min(INFERENCE_SIZE / height, INFERENCE_SIZE / width)
+        new_height, new_width = round(height * scale), round(width * scale)
+        
+        # Pad to the next stride multiple only, like ultralytics' rect inference
+        padded_height = -(-new_height // LETTERBOX_STRIDE) * LETTERBOX_STRIDE
+        padded_width = -(-new_width // LETTERBOX_STRIDE) * LETTERBOX_STRIDE
+        top = (padded_height - new_height) // 2
+        left = (padded_width - new_width) // 2
+        
+        self._input_buffer = torch.full(
+            (batch_size, padded_height, padded_width, 3),
+            LETTERBOX_FILL,
+            dtype=torch.uint8,
+            pin_memory=self.device.type == "cuda"
+        )
+        self._input_shape = (height, width)
+        self._letterbox = (top, left, new_height, new_width, scale)
+    
+    def _track_result(
+        self,
+        frame: np.ndarray,
+        results,
+        letterbox=None,
+        inplace: bool = False,
+        annotate: bool = True
+    ) -> Tuple[sv.Detections, Optional[np.ndarray]]:
+        """Track, recognize and annotate one frame's YOLOv8 result"""
         # Convert to supervision Detections format
         detections = sv.Detections.from_ultralytics(results)
         
+        # Map boxes from letterboxed input back to frame coordinates
+        if letterbox is not None and len(detections) > 0:
+            top, left, _, _, scale = letterbox
+            xyxy = (detections.xyxy - (left, top, left, top)) / scale
+            height, width = frame.shape[:2]
+            np.clip(xyxy[:, 0::2], 0, width, out=xyxy[:, 0::2])
+            np.clip(xyxy[:, 1::2], 0, height, out=xyxy[:, 1::2])
+            detections.xyxy = xyxy
+        
         # Update tracker with new detections
         detections = self.tracker.update_with_detections(detections)
         
@@ -119,92 +323,114 @@ class PersonTracker:
         # Update person info
         self._update_person_info(detections)
         
-        # Annotate frame
-        annotated_frame = self._annotate_frame(frame.copy(), detections)
+        # Annotate frame (skipped entirely when nobody looks at it)
+        if not annotate:
+            return detections, None
+        
+        annotated_frame = self._annotate_frame(frame if inplace else frame.copy(), detections)
         
         return detections, annotated_frame
     
     def _process_faces(self, frame: np.ndarray, detections: sv.Detections):
         """Process face recognition for detected persons"""
-        for idx, track_id in enumerate(detections.tracker_id):
-            track_id = int(track_id)
-            bbox = detections.xyxy[idx]
-            
-            # Extract person crop
-            x1, y1, x2, y2 = map(int, bbox)
-            x1, y1 = max(0, x1), max(0, y1)
-            x2, y2 = min(frame.shape[1], x2), min(frame.shape[0], y2)
-            
-            person_crop = frame[y1:y2, x1:x2]
+        if len(detections) == 0:
+            return
+        
+        # Track IDs are stable between frames, so recognize only every N-th frame
+        self._face_frame_idx += 1
+        if (self._face_frame_idx - 1) % self.face_recognize_every != 0:
+            return
+        
+        # Detect faces once on the full frame instead of once per person crop
+        faces = self.face_recognizer.detect_faces(frame)
+        
+        if not faces:
+            return
+        
+        face_boxes = np.array([face.bbox for face in faces], dtype=np.float32)
+        face_centers = (face_boxes[:, :2] + face_boxes[:, 2:]) / 2
+        
+        # (persons, faces) mask of face centers inside each person box
+        boxes = detections.xyxy
+        inside = (
+            (face_centers[None, :, 0] >= boxes[:, None, 0])
+            & (face_centers[None, :, 0] <= boxes[:, None, 2])
+            & (face_centers[None, :, 1] >= boxes[:, None, 1])
+            & (face_centers[None, :, 1] <= boxes[:, None, 3])
+        )
+        
+        # Prefer the face nearest the top-center of the box (where the head is)
+        head_points = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 1]], axis=1)
+        distances = np.linalg.norm(face_centers[None, :, :] - head_points[:, None, :], axis=2)
+        distances[~inside] = np.inf
+        
+        # A face inside overlapping boxes goes to one person only (the nearest head)
+        for idx, face_idx in _assign_faces(distances):
+            track_id = int(detections.tracker_id[idx])
             
-            if person_crop.size == 0:
-                continue
+            face = faces[face_idx]
+            face_id = face.face_id
             
-            # Detect faces in person crop
-            faces = self.face_recognizer.detect_faces(person_crop)
+            # Get or create unique ID
+            if track_id not in self.track_id_to_unique_id:
+                # Check if this face has been seen before with different track_id
+                existing_track_id = self._find_track_id_by_face(face_id)
+                
+                if existing_track_id is not None:
+                    # Merge: use existing unique_id
+                    unique_id = self.track_id_to_unique_id[existing_track_id]
+                    self.track_id_to_unique_id[track_id] = unique_id
+                else:
+                    # New unique person
+                    unique_id = self.next_unique_id
+                    self.next_unique_id += 1
+                    self.track_id_to_unique_id[track_id] = unique_id
             
-            if faces:
-                # Use first detected face
-                face = faces[0]
-                face_id = face.face_id
+            # Update person info with face_id
+            if track_id in self.persons:
+                person = self.persons[track_id]
                 
-                # Get or create unique ID
-                if track_id not in self.track_id_to_unique_id:
-                    # Check if this face has been seen before with different track_id
-                    existing_track_id = self._find_track_id_by_face(face_id)
-                    
-                    if existing_track_id is not None:
-                        # Merge: use existing unique_id
-                        unique_id = self.track_id_to_unique_id[existing_track_id]
-                        self.track_id_to_unique_id[track_id] = unique_id
-                    else:
-                        # New unique person
-                        unique_id = self.next_unique_id
-                        self.next_unique_id += 1
-                        self.track_id_to_unique_id[track_id] = unique_id
+                # Drop the stale reverse mapping if this track's face changed
+                if (person.face_id is not None and person.face_id != face_id
+                        and self.face_id_to_track_id.get(person.face_id) == track_id):
+                    del self.face_id_to_track_id[person.face_id]
                 
-                # Update person info with face_id
-                if track_id in self.persons:
-                    self.persons[track_id].face_id = face_id
-                    self.persons[track_id].unique_id = self.track_id_to_unique_id[track_id]
+                person.face_id = face_id
+                person.unique_id = self.track_id_to_unique_id[track_id]
+                self.face_id_to_track_id[face_id] = track_id
     
     def _find_track_id_by_face(self, face_id: int) -> Optional[int]:
         """Find existing track_id that has the same face_id"""
-        for tid, person in self.persons.items():
-            if person.face_id == face_id:
-                return tid
-        return None
+        return self.face_id_to_track_id.get(face_id)
     
     def _update_person_info(self, detections: sv.Detections):
         """Update tracking information for each detected person"""
-        current_time = datetime.now()
+        current_time = time.monotonic_ns()
         
         if detections.tracker_id is None:
             return
         
-        for idx, track_id in enumerate(detections.tracker_id):
-            track_id = int(track_id)
-            bbox = detections.xyxy[idx]
-            
+        # Convert all boxes to int32 in one pass rather than per person
+        bboxes = detections.xyxy.astype(np.int32)
+        
+        for track_id, bbox in zip(detections.tracker_id.tolist(), bboxes):
             if track_id not in self.persons:
                 # New person detected
-                self.persons[track_id] = PersonInfo(
+                person = PersonInfo(
                     track_id=track_id,
-                    first_seen=current_time,
-                    last_seen=current_time,
-                    total_frames=1,
-                    bbox_history=[tuple(bbox)]
+                    first_seen_ns=current_time,
+                    last_seen_ns=current_time,
+                    total_frames=1
                 )
+                self.persons[track_id] = person
             else:
                 # Update existing person
                 person = self.persons[track_id]
-                person.last_seen = current_time
+                person.last_seen_ns = current_time
                 person.total_frames += 1
-                person.bbox_history.append(tuple(bbox))
-                
-                # Keep only last 30 bboxes to save memory
-                if len(person.bbox_history) > 30:
-                    person.bbox_history = person.bbox_history[-30:]
+            
+            # Fixed-size history, no per-frame allocation
+            person.add_bbox(bbox)
     
     def _annotate_frame(self, frame: np.ndarray, detections: sv.Detections) -> np.ndarray:
         """Draw bounding boxes and labels on frame"""
@@ -218,7 +444,7 @@ class PersonTracker:
             person_info = self.persons.get(int(track_id))
             
             if person_info:
-                duration = (person_info.last_seen - person_info.first_seen).total_seconds()
+                duration = person_info.duration
                 
                 # Use unique_id if face recognition is enabled, otherwise use track_id
                 if self.use_face_recognition and person_info.unique_id is not None:
@@ -257,11 +483,11 @@ class PersonTracker:
         }
         
         for track_id, person in sorted(self.persons.items()):
-            duration = (person.last_seen - person.first_seen).total_seconds()
+            duration = person.duration
             person_data = {
                 "track_id": track_id,
-                "first_seen": person.first_seen.isoformat(),
-                "last_seen": person.last_seen.isoformat(),
+                "first_seen": _monotonic_to_datetime(person.first_seen_ns).isoformat(),
+                "last_seen": _monotonic_to_datetime(person.last_seen_ns).isoformat(),
                 "duration_seconds": round(duration, 2),
                 "total_frames": person.total_frames
             }
@@ -279,7 +505,9 @@ class PersonTracker:
         self.tracker = sv.ByteTrack()
         self.persons.clear()
         self.track_id_to_unique_id.clear()
+        self.face_id_to_track_id.clear()
         self.next_unique_id = 1
+        self._face_frame_idx = 0
         
         if self.face_recognizer:
             # Don't reset face database to maintain recognition across sessions
@@ -305,7 +533,11 @@ def process_video(
     model_path: str = "yolov8n.pt",
     confidence: float = 0.5,
     display: bool = True,
-    use_face_recognition: bool = False
+    use_face_recognition: bool = False,
+    target_fps: Optional[float] = None,
+    hw_accel: bool = True,
+    batch_size: int = 8,
+    tracker: Optional[PersonTracker] = None
 ) -> Dict:
     """
     Process a video file and track all persons
@@ -317,19 +549,28 @@ def process_video(
         confidence: Detection confidence threshold
         display: Whether to display video while processing
         use_face_recognition: Enable face recognition for re-identification
+        target_fps: Track at this rate instead of every frame (skipped frames
+                    are grabbed but not decoded). None = process every frame
+        hw_accel: Use GPU video decode/encode (NVDEC/NVENC) when available
+        batch_size: Number of frames sent to YOLOv8 per inference call
+        tracker: Reuse an already-loaded PersonTracker (its state is reset);
+                 model_path/confidence/use_face_recognition are then ignored
         
     Returns:
         Dictionary with tracking summary
     """
-    # Initialize tracker
-    tracker = PersonTracker(
-        model_path=model_path, 
-        confidence=confidence,
-        use_face_recognition=use_face_recognition
-    )
+    # Initialize tracker (or start a fresh session on the given one)
+    if tracker is None:
+        tracker = PersonTracker(
+            model_path=model_path, 
+            confidence=confidence,
+            use_face_recognition=use_face_recognition
+        )
+    else:
+        tracker.reset()
     
     # Open video
-    cap = cv2.VideoCapture(video_path)
+    cap = open_video_capture(video_path, hw_accel=hw_accel)
     if not cap.isOpened():
         raise ValueError(f"Cannot open video: {video_path}")
     
@@ -339,29 +580,47 @@ def process_video(
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     
+    # Only decode every `stride`-th frame
+    stride = max(1, round(fps / target_fps)) if target_fps and fps > 0 else 1
+    
     print(f"📹 Processing video: {video_path}")
     print(f"  - Resolution: {width}x{height}")
     print(f"  - FPS: {fps}")
-    print(f"  - Total frames: {total_frames}\n")
+    print(f"  - Total frames: {total_frames}")
+    print(f"  - Processing every {stride} frame(s)\n")
     
     # Setup video writer if output path provided
     writer = None
     if output_path:
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        writer = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        writer = open_video_writer(output_path, fps / stride, (width, height), hw_accel=hw_accel)
     
     frame_count = 0
+    processed_count = 0
     
-    try:
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame_count += 1
-            
-            # Detect and track
-            detections, annotated_frame = tracker.detect_and_track(frame)
+    # Frames waiting for the next batched inference call: (frame number, frame)
+    batch: List[Tuple[int, np.ndarray]] = []
+    
+    # Headless runs only need tracking data, not drawn frames
+    annotate = display or writer is not None
+    
+    # One preallocated decode buffer per batch slot, reused for every batch
+    frame_buffers = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(batch_size)]
+    
+    def flush_batch() -> bool:
+        """Run the buffered frames through the tracker; False if user quit"""
+        nonlocal processed_count
+        
+        # Frames are pooled buffers owned by this loop, so annotate in place
+        results = tracker.detect_and_track_batch(
+            [frame for _, frame in batch],
+            inplace=True,
+            annotate=annotate
+        )
+        frame_numbers = [number for number, _ in batch]
+        batch.clear()
+        
+        for frame_number, (detections, annotated_frame) in zip(frame_numbers, results):
+            processed_count += 1
             
             # Write to output video
             if writer:
@@ -372,7 +631,7 @@ def process_video(
                 # Add frame counter
                 cv2.putText(
                     annotated_frame,
-                    f"Frame: {frame_count}/{total_frames} | Persons: {len(tracker.persons)}",
+                    f"Frame: {frame_number}/{total_frames} | Persons: {len(tracker.persons)}",
                     (10, 30),
                     cv2.FONT_HERSHEY_SIMPLEX,
                     1,
@@ -385,12 +644,39 @@ def process_video(
                 # Press 'q' to quit
                 if cv2.waitKey(1) & 0xFF == ord('q'):
                     print("\n⚠️  Stopped by user")
-                    break
+                    return False
             
             # Print progress
-            if frame_count % 30 == 0:
-                progress = (frame_count / total_frames) * 100
+            if processed_count % 30 == 0:
+                progress = (frame_number / total_frames) * 100
                 print(f"Progress: {progress:.1f}% | Unique persons: {len(tracker.persons)}")
+        
+        return True
+    
+    try:
+        while True:
+            # grab() only advances the stream; decode happens in retrieve()
+            if not cap.grab():
+                break
+            
+            frame_count += 1
+            
+            if (frame_count - 1) % stride != 0:
+                continue
+            
+            # Decode into a pooled buffer (each batch slot reuses its own)
+            ret, frame = cap.retrieve(frame_buffers[len(batch)])
+            if not ret:
+                break
+            
+            batch.append((frame_count, frame))
+            
+            # Detect and track
+            if len(batch) >= batch_size and not flush_batch():
+                break
+        
+        if batch:
+            flush_batch()
     
     finally:
         cap.release()
@@ -399,7 +685,7 @@ def process_video(
         cv2.destroyAllWindows()
     
     print(f"\n✓ Video processing complete!")
-    print(f"  - Frames processed: {frame_count}")
+    print(f"  - Frames processed: {processed_count}/{frame_count}")
     print(f"  - Unique persons detected: {len(tracker.persons)}")
     
     if output_path:
@@ -413,7 +699,9 @@ def process_images(
     output_dir: Optional[str] = None,
     model_path: str = "yolov8n.pt",
     confidence: float = 0.5,
-    use_face_recognition: bool = False
+    use_face_recognition: bool = False,
+    tracker: Optional[PersonTracker] = None,
+    face_encoding_cache: Optional[str] = None
 ) -> Dict:
     """
     Process multiple images as if they were video frames
@@ -424,15 +712,23 @@ def process_images(
         model_path: Path to YOLOv8 model
         confidence: Detection confidence threshold
         use_face_recognition: Enable face recognition for re-identification
+        tracker: Reuse an already-loaded PersonTracker (its state is reset);
+                 model_path/confidence/use_face_recognition are then ignored
+        face_encoding_cache: Optional pickle file caching face encodings, so
+                             images seen in an earlier run skip face encoding
         
     Returns:
         Dictionary with tracking summary
     """
-    tracker = PersonTracker(
-        model_path=model_path, 
-        confidence=confidence,
-        use_face_recognition=use_face_recognition
-    )
+    if tracker is None:
+        tracker = PersonTracker(
+            model_path=model_path, 
+            confidence=confidence,
+            use_face_recognition=use_face_recognition,
+            face_encoding_cache=face_encoding_cache
+        )
+    else:
+        tracker.reset()
     
     print(f"📸 Processing {len(image_paths)} images...")
     
@@ -466,4 +762,7 @@ def process_images(
     if output_dir:
         print(f"  - Output saved to: {output_dir}")
     
+    if tracker.face_recognizer:
+        tracker.face_recognizer.save_encoding_cache()
+    
     return tracker.get_tracking_summary()
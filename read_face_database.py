@@ -1,36 +1,53 @@
+import json
 import pickle
 import numpy as np
+from pathlib import Path
 
-# ระบุ Path ให้ถูกต้อง
-db_path = "test/output/face_database.pkl"
+# ระบุ Path ให้ถูกต้อง (FaceRecognizer.save_database เขียนเป็น .npy + .json)
+db_path = Path("test/output/face_database.pkl")
+encodings_path = db_path.with_suffix(".npy")
+meta_path = db_path.with_suffix(".json")
 
 try:
-    with open(db_path, 'rb') as f:
-        data = pickle.load(f)
-        
-    print(f"--- อ่านข้อมูลจาก {db_path} สำเร็จ ---")
-    print(f"Keys ใน Data: {list(data.keys())}")
-    
-    # ดึงข้อมูลออกมา
-    ids = data['ids']
-    names = data['names']
-    encodings = data['encodings']
-    tolerance = data.get('tolerance', 'N/A')
-    
+    if encodings_path.exists() and meta_path.exists():
+        # Encodings เป็น float32 matrix (N, 128) เปิดแบบ memory-map ไม่ต้องโหลดทั้งไฟล์
+        encodings = np.load(encodings_path, mmap_mode='r')
+
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        ids = meta['ids']
+        names = {int(fid): name for fid, name in meta.get('names', {}).items()}
+        tolerance = meta.get('tolerance', 'N/A')
+
+        print(f"--- อ่านข้อมูลจาก {encodings_path} + {meta_path.name} สำเร็จ ---")
+        print(f"Keys ใน Metadata: {list(meta.keys())}")
+    else:
+        # ไฟล์ฐานข้อมูลแบบเก่า (pickle)
+        with open(db_path, 'rb') as f:
+            data = pickle.load(f)
+
+        ids = data['ids']
+        names = data['names']
+        encodings = data['encodings']
+        tolerance = data.get('tolerance', 'N/A')
+
+        print(f"--- อ่านข้อมูลจาก {db_path} สำเร็จ ---")
+        print(f"Keys ใน Data: {list(data.keys())}")
+
     print(f"Tolerance (ความเข้มงวด): {tolerance}")
     print(f"\nพบข้อมูลทั้งหมด {len(ids)} รายการ:\n")
-    
+
     for i, face_id in enumerate(ids):
         name = names.get(face_id, "Unknown")
-        encoding = encodings[i]
-        
-        # แสดง 5 ตัวแรกของ Encoding
-        encoding_sample = ", ".join([f"{x:.4f}" for x in encoding[:5]])
+
+        # อ่านเฉพาะ 5 ตัวแรกของ Encoding (memory-map โหลดเฉพาะส่วนที่ใช้)
+        encoding_sample = ", ".join([f"{x:.4f}" for x in encodings[i][:5]])
         print(f"ID: {face_id} | Name: {name}")
         print(f"   Encoding (first 5): [{encoding_sample}, ...]")
         print("-" * 50)
-        
+
 except FileNotFoundError:
     print(f"ไม่พบไฟล์ที่: {db_path}")
 except Exception as e:
-    print(f"เกิดข้อผิดพลาด: {e}")
\ No newline at end of file
+    print(f"เกิดข้อผิดพลาด: {e}")
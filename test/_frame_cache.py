@@ -0,0 +1,86 @@
+"""
+Test image helpers: cached directory listing and decoded-frame cache
+
+Decoding the same JPEGs from image/IMAGE_001 on every test run is pure CPU
+work. The first run stores the decoded BGR frames in one raw uint8 file
+(test/output/frame_cache/<key>.raw) next to a small JSON header; later runs
+memory-map it instead of decoding. The key covers the file names, sizes and
+mtimes, so changed images rebuild the cache.
+"""
+
+import hashlib
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+CACHE_DIR = Path(__file__).parent / "output" / "frame_cache"
+
+# FAST_MODE=1 decodes test images at half size inside the JPEG decoder
+# (about 4x fewer pixels for detection, small recall cost on tiny faces)
+FAST_MODE = os.environ.get("FAST_MODE", "") not in ("", "0")
+IMREAD_FLAGS = cv2.IMREAD_REDUCED_COLOR_2 if FAST_MODE else cv2.IMREAD_COLOR
+
+
+@lru_cache(maxsize=None)
+def sorted_jpgs(image_dir: Path) -> Tuple[Path, ...]:
+    """.jpg files in a directory sorted by their integer timestamp name (listed once per run)"""
+    return tuple(sorted(Path(image_dir).glob("*.jpg"), key=lambda p: int(p.stem)))
+
+
+def _cache_key(paths: Sequence[Path], flags: int) -> str:
+    """Hash of the paths plus their size/mtime (changes when any image changes)"""
+    digest = hashlib.sha1(f"flags={flags}\n".encode())
+    for path in paths:
+        stat = path.stat()
+        digest.update(f"{path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def load_frames(paths: Sequence[Path], flags: int = cv2.IMREAD_COLOR) -> List[Optional[np.ndarray]]:
+    """
+    Decoded BGR frames for `paths`, in order (None for unreadable images)
+
+    Frames come from a memory-mapped cache when all images share one size;
+    otherwise they are decoded normally. `flags` is passed to cv2.imread
+    (e.g. cv2.IMREAD_REDUCED_COLOR_2 to decode at half size).
+    """
+    paths = [Path(p) for p in paths]
+    if not paths:
+        return []
+
+    key = _cache_key(paths, flags)
+    raw_path = CACHE_DIR / f"{key}.raw"
+    header_path = CACHE_DIR / f"{key}.json"
+
+    if raw_path.exists() and header_path.exists():
+        with open(header_path, 'r', encoding='utf-8') as f:
+            header = json.load(f)
+        # Copy-on-write: tests may draw on the frames without touching the cache
+        frames = np.memmap(raw_path, dtype=np.uint8, mode='c', shape=tuple(header['shape']))
+        return [frames[i] if ok else None for i, ok in enumerate(header['readable'])]
+
+    images = [cv2.imread(str(p), flags) for p in paths]
+    shapes = {img.shape for img in images if img is not None}
+
+    # Only cache uniform frame sizes (one (N, H, W, 3) array)
+    if len(shapes) != 1:
+        return images
+
+    shape = (len(images),) + shapes.pop()
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+    frames = np.memmap(raw_path, dtype=np.uint8, mode='w+', shape=shape)
+    for i, img in enumerate(images):
+        if img is not None:
+            frames[i] = img
+    frames.flush()
+
+    with open(header_path, 'w', encoding='utf-8') as f:
+        json.dump({'shape': shape, 'readable': [img is not None for img in images]}, f)
+
+    return images
@@ -0,0 +1,39 @@
+"""
+JSON writer for test summaries
+
+Uses orjson (C encoder, much faster on large tracking summaries) when it is
+installed and falls back to the stdlib json module otherwise. Both paths
+write indented UTF-8 and accept numpy scalars/arrays.
+"""
+
+from pathlib import Path
+from typing import Any, Union
+
+import numpy as np
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    import json
+    ORJSON_AVAILABLE = False
+
+
+def _to_builtin(obj: Any) -> Any:
+    """json fallback for numpy values (orjson handles these natively)"""
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    return str(obj)
+
+
+def dump_json(obj: Any, path: Union[str, Path]) -> None:
+    """Write `obj` to `path` as indented JSON"""
+    if ORJSON_AVAILABLE:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(
+                obj,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            ))
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(obj, f, indent=2, ensure_ascii=False, default=_to_builtin)
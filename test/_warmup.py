@@ -0,0 +1,33 @@
+"""
+Model warm-up for tests
+
+The first inference pays one-off costs (weight upload, cuDNN algorithm
+selection, dlib model loading), which would otherwise land on the first test
+image. Running each model once on a blank frame keeps that out of the
+per-image timings and counts.
+"""
+
+import numpy as np
+
+WARMUP_FRAME = np.zeros((640, 640, 3), dtype=np.uint8)
+
+
+def warmup(detector=None, tracker=None, recognizer=None) -> None:
+    """
+    Run each given model once on a blank 640x640 frame and discard the result
+
+    Args:
+        detector: HumanDetector
+        tracker: PersonTracker (reset afterwards so tracking starts clean)
+        recognizer: FaceRecognizer (a blank frame has no faces, so its
+                    database is unchanged)
+    """
+    if detector is not None:
+        detector.detect(WARMUP_FRAME)
+
+    if tracker is not None:
+        tracker.detect_and_track(WARMUP_FRAME, annotate=False)
+        tracker.reset()
+
+    if recognizer is not None:
+        recognizer.detect_faces(WARMUP_FRAME)
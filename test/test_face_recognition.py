@@ -8,16 +8,31 @@ Tests face recognition capabilities:
 """
 
 import sys
-import json
 import cv2
+import numpy as np
+import torch
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
+TEST_DIR = Path(__file__).resolve().parent
+ROOT_DIR = TEST_DIR.parent
+IMG_DIR = ROOT_DIR / "image" / "IMAGE_001"
+OUTPUT_DIR = TEST_DIR / "output"
+OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
 # Add parent directory to path
-sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(ROOT_DIR))
 
-from face_recognizer import FaceRecognizer, compare_faces
+from face_recognizer import FaceRecognizer
 from person_tracker import PersonTracker, process_images
+from _frame_cache import IMREAD_FLAGS, load_frames, sorted_jpgs
+from _json_io import dump_json
+from _warmup import warmup
+
+# Face encodings shared by the tracking tests (and later runs) over the same images
+ENCODING_CACHE = OUTPUT_DIR / "face_encoding_cache.pkl"
 
 
 def test_basic_face_recognition():
@@ -26,8 +41,8 @@ def test_basic_face_recognition():
     print("TEST 1: Basic Face Recognition")
     print("=" * 80 + "\n")
     
-    img_dir = Path(__file__).parent.parent / "image" / "IMAGE_001"
-    output_dir = Path(__file__).parent / "output" / "face_recognition"
+    img_dir = IMG_DIR
+    output_dir = OUTPUT_DIR / "face_recognition"
     output_dir.mkdir(exist_ok=True, parents=True)
     
     if not img_dir.exists():
@@ -35,7 +50,7 @@ def test_basic_face_recognition():
         return
     
     # Get first few images
-    image_files = sorted(img_dir.glob("*.jpg"), key=lambda p: int(p.stem))[:10]
+    image_files = sorted_jpgs(img_dir)[:10]
     
     if not image_files:
         print(f"❌ No images found in {img_dir}")
@@ -45,26 +60,31 @@ def test_basic_face_recognition():
     
     try:
         recognizer = FaceRecognizer(tolerance=0.6, model="hog")
+        warmup(recognizer=recognizer)
         
-        for idx, img_path in enumerate(image_files, 1):
-            frame = cv2.imread(str(img_path))
-            if frame is None:
-                continue
-            
-            # Detect faces
-            faces = recognizer.detect_faces(frame)
-            
-            if faces:
-                print(f"Image {idx}: Found {len(faces)} face(s)")
-                for face in faces:
-                    print(f"  - Face ID: {face.face_id}, Confidence: {face.confidence:.2f}")
+        # Decoded once, then memory-mapped from test/output/frame_cache
+        frames = load_frames(image_files, IMREAD_FLAGS)
+        
+        # JPEG encoding of annotated images overlaps with the next detection
+        with ThreadPoolExecutor(max_workers=4) as io_pool:
+            for idx, (img_path, frame) in enumerate(zip(image_files, frames), 1):
+                if frame is None:
+                    continue
                 
-                # Draw and save
-                annotated = recognizer.draw_faces(frame, faces)
-                output_path = output_dir / f"face_{img_path.name}"
-                cv2.imwrite(str(output_path), annotated)
-            else:
-                print(f"Image {idx}: No faces detected")
+                # Detect faces
+                faces = recognizer.detect_faces(frame)
+                
+                if faces:
+                    print(f"Image {idx}: Found {len(faces)} face(s)")
+                    for face in faces:
+                        print(f"  - Face ID: {face.face_id}, Confidence: {face.confidence:.2f}")
+                    
+                    # Draw and save
+                    annotated = recognizer.draw_faces(frame, faces, inplace=True)
+                    output_path = output_dir / f"face_{img_path.name}"
+                    io_pool.submit(cv2.imwrite, str(output_path), annotated)
+                else:
+                    print(f"Image {idx}: No faces detected")
         
         # Print statistics
         stats = recognizer.get_statistics()
@@ -74,7 +94,7 @@ def test_basic_face_recognition():
         print(f"  - Unnamed faces: {stats['unnamed_faces']}")
         
         # Save face database
-        db_path = Path(__file__).parent / "output" / "face_database.pkl"
+        db_path = OUTPUT_DIR / "face_database.pkl"
         recognizer.save_database(str(db_path))
         print(f"\n✓ Annotated images saved to: {output_dir}")
         
@@ -90,35 +110,58 @@ def test_face_comparison():
     print("TEST 2: Face Comparison")
     print("=" * 80 + "\n")
     
-    img_dir = Path(__file__).parent.parent / "image" / "IMAGE_001"
+    img_dir = IMG_DIR
     
     if not img_dir.exists():
         print(f"❌ Image directory not found: {img_dir}")
         return
     
-    image_files = sorted(img_dir.glob("*.jpg"), key=lambda p: int(p.stem))[:20]
+    image_files = sorted_jpgs(img_dir)[:20]
     
     if len(image_files) < 2:
         print(f"❌ Need at least 2 images")
         return
     
     # Compare first image with several others
-    base_image = str(image_files[0])
+    # Every image is decoded and encoded once; the base encoding is reused and
+    # all distances come from one vectorized norm
+    tolerance = 0.6
+    recognizer = FaceRecognizer(tolerance=tolerance)
     
     print(f"Base image: {image_files[0].name}\n")
     
+    base_frame = cv2.imread(str(image_files[0]))
+    base_faces = recognizer.detect_faces(base_frame) if base_frame is not None else []
+    
+    candidates = []
     for img_file in image_files[1:6]:
-        result = compare_faces(base_image, str(img_file), tolerance=0.6)
+        frame = cv2.imread(str(img_file))
+        if base_frame is None or frame is None:
+            print(f"❌ {img_file.name}: Could not load one or both images")
+            continue
+        
+        faces = recognizer.detect_faces(frame)
+        if not base_faces or not faces:
+            print(f"✗ NO MATCH - {img_file.name}")
+            print(f"  Reason: No faces detected in one or both images")
+            continue
         
-        if 'error' in result:
-            print(f"❌ {img_file.name}: {result['error']}")
-        elif not result['match']:
+        candidates.append((img_file, faces[0].encoding))
+    
+    if not candidates:
+        return
+    
+    # Distances from the base face to every candidate, (K, 128) -> (K,)
+    candidate_encodings = np.stack([encoding for _, encoding in candidates])
+    distances = np.linalg.norm(candidate_encodings - base_faces[0].encoding, axis=1)
+    
+    for (img_file, _), distance in zip(candidates, distances):
+        if distance > tolerance:
             print(f"✗ NO MATCH - {img_file.name}")
-            print(f"  Reason: {result.get('reason', 'Unknown')}")
+            print(f"  Reason: Unknown")
         else:
-            match_status = "✓ MATCH" if result['match'] else "✗ NO MATCH"
-            print(f"{match_status} - {img_file.name}")
-            print(f"  Distance: {result['distance']:.4f}, Confidence: {result['confidence']:.2f}")
+            print(f"✓ MATCH - {img_file.name}")
+            print(f"  Distance: {distance:.4f}, Confidence: {1.0 - distance:.2f}")
 
 
 def test_tracking_with_face_recognition():
@@ -127,8 +170,8 @@ def test_tracking_with_face_recognition():
     print("TEST 3: Person Tracking + Face Recognition")
     print("=" * 80 + "\n")
     
-    img_dir = Path(__file__).parent.parent / "image" / "IMAGE_001"
-    output_dir = Path(__file__).parent / "output" / "tracked_with_faces"
+    img_dir = IMG_DIR
+    output_dir = OUTPUT_DIR / "tracked_with_faces"
     output_dir.mkdir(exist_ok=True, parents=True)
     
     if not img_dir.exists():
@@ -136,10 +179,7 @@ def test_tracking_with_face_recognition():
         return
     
     # Get images
-    image_files = sorted(
-        img_dir.glob("*.jpg"),
-        key=lambda p: int(p.stem)
-    )[:100]
+    image_files = sorted_jpgs(img_dir)[:100]
     
     if not image_files:
         print(f"❌ No images found in {img_dir}")
@@ -152,7 +192,8 @@ def test_tracking_with_face_recognition():
             image_paths=[str(p) for p in image_files],
             output_dir=str(output_dir),
             confidence=0.5,
-            use_face_recognition=True  # Enable face recognition!
+            use_face_recognition=True,  # Enable face recognition!
+            face_encoding_cache=str(ENCODING_CACHE)
         )
         
         # Print summary
@@ -168,33 +209,31 @@ def test_tracking_with_face_recognition():
             print(f"\n👥 Person Details:")
             print("-" * 80)
             
-            # Group by unique_id
-            unique_persons = {}
+            # Group by unique_id in one pass (tracks without a unique_id are skipped
+            # here, which also keeps None out of the sort below)
+            unique_persons = defaultdict(list)
             for person in summary['persons']:
                 uid = person.get('unique_id')
-                if uid not in unique_persons:
-                    unique_persons[uid] = []
-                unique_persons[uid].append(person)
+                if uid is not None:
+                    unique_persons[uid].append(person)
             
             for unique_id, tracks in sorted(unique_persons.items()):
-                if unique_id is None:
-                    continue
-                    
                 total_frames = sum(p['total_frames'] for p in tracks)
                 track_ids = [p['track_id'] for p in tracks]
-                face_ids = set(p.get('face_id') for p in tracks if p.get('face_id'))
+                # Face IDs in first-seen order, without duplicates (tracks that
+                # carry a unique_id always have a face_id key)
+                face_ids = list(dict.fromkeys(p['face_id'] for p in tracks if p['face_id'] is not None))
                 
                 print(f"\n  Unique Person #{unique_id}:")
                 print(f"    - Tracking IDs: {track_ids} (merged)")
-                print(f"    - Face IDs: {list(face_ids)}")
+                print(f"    - Face IDs: {face_ids}")
                 print(f"    - Total frames: {total_frames}")
                 print(f"    - First seen: {tracks[0]['first_seen']}")
                 print(f"    - Last seen: {tracks[-1]['last_seen']}")
         
         # Save summary
-        summary_file = Path(__file__).parent / "output" / "tracking_with_faces_summary.json"
-        with open(summary_file, 'w', encoding='utf-8') as f:
-            json.dump(summary, f, indent=2, ensure_ascii=False)
+        summary_file = OUTPUT_DIR / "tracking_with_faces_summary.json"
+        dump_json(summary, summary_file)
         
         print(f"\n✓ Summary saved to: {summary_file}")
         print(f"✓ Annotated images saved to: {output_dir}\n")
@@ -211,16 +250,13 @@ def test_comparison_no_face_vs_with_face():
     print("TEST 4: Comparison - Tracking Only vs Tracking + Face Recognition")
     print("=" * 80 + "\n")
     
-    img_dir = Path(__file__).parent.parent / "image" / "IMAGE_001"
+    img_dir = IMG_DIR
     
     if not img_dir.exists():
         print(f"❌ Image directory not found: {img_dir}")
         return
     
-    image_files = sorted(
-        img_dir.glob("*.jpg"),
-        key=lambda p: int(p.stem)
-    )[:50]
+    image_files = sorted_jpgs(img_dir)[:50]
     
     if not image_files:
         print(f"❌ No images found in {img_dir}")
@@ -229,23 +265,52 @@ def test_comparison_no_face_vs_with_face():
     print(f"Processing {len(image_files)} images...\n")
     
     try:
-        # Test WITHOUT face recognition
-        print("🔵 Test 1: Tracking ONLY (no face recognition)")
-        summary_no_face = process_images(
-            image_paths=[str(p) for p in image_files],
-            output_dir=None,
-            confidence=0.5,
-            use_face_recognition=False
-        )
+        image_paths = [str(p) for p in image_files]
         
-        # Test WITH face recognition
-        print("\n🟢 Test 2: Tracking + Face Recognition")
-        summary_with_face = process_images(
-            image_paths=[str(p) for p in image_files],
-            output_dir=None,
-            confidence=0.5,
-            use_face_recognition=True
-        )
+        # The two runs share no state, so run them in separate processes on CPU.
+        # With any GPU, run them one after the other: PersonTracker always uses
+        # cuda:0, so both workers would share that one device.
+        if torch.cuda.device_count() > 0:
+            # Test WITHOUT face recognition
+            print("🔵 Test 1: Tracking ONLY (no face recognition)")
+            summary_no_face = process_images(
+                image_paths=image_paths,
+                output_dir=None,
+                confidence=0.5,
+                use_face_recognition=False
+            )
+            
+            # Test WITH face recognition
+            print("\n🟢 Test 2: Tracking + Face Recognition")
+            summary_with_face = process_images(
+                image_paths=image_paths,
+                output_dir=None,
+                confidence=0.5,
+                use_face_recognition=True,
+                face_encoding_cache=str(ENCODING_CACHE)
+            )
+        else:
+            print("🔵 Test 1: Tracking ONLY (no face recognition)")
+            print("🟢 Test 2: Tracking + Face Recognition")
+            print("   (running both in parallel)\n")
+            with ProcessPoolExecutor(max_workers=2) as pool:
+                no_face = pool.submit(
+                    process_images,
+                    image_paths=image_paths,
+                    output_dir=None,
+                    confidence=0.5,
+                    use_face_recognition=False
+                )
+                with_face = pool.submit(
+                    process_images,
+                    image_paths=image_paths,
+                    output_dir=None,
+                    confidence=0.5,
+                    use_face_recognition=True,
+                    face_encoding_cache=str(ENCODING_CACHE)
+                )
+                summary_no_face = no_face.result()
+                summary_with_face = with_face.result()
         
         # Compare results
         print("\n" + "=" * 80)
@@ -273,6 +338,70 @@ def test_comparison_no_face_vs_with_face():
         traceback.print_exc()
 
 
+def test_quantized_matching():
+    """int8 matching picks the same face ID as float32, with ~0.01 distance error"""
+    print("\n" + "=" * 80)
+    print("TEST 5: Quantized (int8) vs float32 Matching")
+    print("=" * 80 + "\n")
+    
+    rng = np.random.default_rng(0)
+    known = rng.normal(size=(50, 128)).astype(np.float32)
+    known /= np.linalg.norm(known, axis=1, keepdims=True)
+    
+    recognizers = [FaceRecognizer(), FaceRecognizer(quantize=True)]
+    for recognizer in recognizers:
+        for encoding in known:
+            recognizer._add_new_face(encoding)
+    float_recognizer, int8_recognizer = recognizers
+    
+    # Queries at typical same-person distances (about 0.3-0.5)
+    max_error = 0.0
+    for i in range(200):
+        query = known[i % len(known)] + rng.normal(scale=0.035, size=128).astype(np.float32)
+        
+        float_id, float_confidence = float_recognizer._match_face(query)
+        int8_id, int8_confidence = int8_recognizer._match_face(query)
+        
+        assert float_id == int8_id == i % len(known) + 1
+        max_error = max(max_error, abs(float_confidence - int8_confidence))
+    
+    print(f"✓ Same face ID for all queries, max distance error {max_error:.4f}")
+    assert max_error <= 0.01
+
+
+def test_consolidate():
+    """consolidate() merges near-identical face IDs and keeps their names"""
+    print("\n" + "=" * 80)
+    print("TEST 6: Consolidating Duplicate Face IDs")
+    print("=" * 80 + "\n")
+    
+    rng = np.random.default_rng(0)
+    people = rng.normal(size=(3, 128)).astype(np.float32)
+    people /= np.linalg.norm(people, axis=1, keepdims=True)
+    
+    recognizer = FaceRecognizer(tolerance=0.6)
+    # IDs 1-3 are three different people; ID 4 is person 2 again, added as a
+    # separate ID (e.g. seen before their first ID's centroid settled)
+    for encoding in people:
+        recognizer._add_new_face(encoding)
+    recognizer._add_new_face(people[1] + rng.normal(scale=0.01, size=128).astype(np.float32))
+    recognizer.set_face_name(4, "Alice")
+    
+    before = recognizer.get_statistics()
+    merged = recognizer.consolidate()
+    after = recognizer.get_statistics()
+    
+    print(f"✓ Merged {merged} face ID(s): {before} -> {after}")
+    assert merged == 1
+    assert sorted(set(recognizer.known_face_ids)) == [1, 2, 3]
+    assert recognizer.known_face_names == {2: "Alice"}
+    assert recognizer._match_face(people[1])[0] == 2
+    # Samples are relabeled, not dropped; only the number of IDs goes down
+    assert after['total_ids'] == before['total_ids'] - 1 == 3
+    assert after['total_faces'] == before['total_faces']
+    assert after['named_faces'] == before['named_faces']
+
+
 if __name__ == "__main__":
     print("\n🚀 FACE RECOGNITION + TRACKING TESTING SUITE\n")
     
@@ -281,6 +410,8 @@ if __name__ == "__main__":
     test_face_comparison()
     test_tracking_with_face_recognition()
     test_comparison_no_face_vs_with_face()
+    test_quantized_matching()
+    test_consolidate()
     
     print("\n" + "=" * 80)
     print("✅ ALL TESTS COMPLETE!")
@@ -8,21 +8,32 @@ and saves annotated results to test/output/
 import sys
 from pathlib import Path
 import cv2
-import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+TEST_DIR = Path(__file__).resolve().parent
+ROOT_DIR = TEST_DIR.parent
+IMG_DIR = ROOT_DIR / "image" / "IMAGE_001"
+OUTPUT_DIR = TEST_DIR / "output"
+OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
 # Add parent directory to path
-sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(ROOT_DIR))
 
 from human_detector import HumanDetector
+from _frame_cache import IMREAD_FLAGS, load_frames, sorted_jpgs
+from _json_io import dump_json
+from _warmup import warmup
+
+BATCH_SIZE = 16  # images per YOLOv8 forward pass
 
 
 def test_human_detection():
     """Test detection on sample images from dataset"""
     
     # Setup paths
-    img_dir = Path(__file__).parent.parent / "image" / "IMAGE_001"
-    output_dir = Path(__file__).parent / "output"
+    img_dir = IMG_DIR
+    output_dir = OUTPUT_DIR
     output_dir.mkdir(exist_ok=True)
     
     if not img_dir.exists():
@@ -30,10 +41,7 @@ def test_human_detection():
         return
     
     # Get sample images (first 10 or all if less)
-    image_files = sorted(
-        img_dir.glob("*.jpg"),
-        key=lambda p: int(p.stem)
-    )[:100]
+    image_files = sorted_jpgs(img_dir)[:100]
     
     if not image_files:
         print(f"❌ No images found in {img_dir}")
@@ -50,6 +58,7 @@ def test_human_detection():
         print("  pip install ultralytics")
         return
     
+    warmup(detector=detector)
     print("✓ Detector initialized\n")
     print("Running detection on sample images...\n")
     
@@ -63,36 +72,45 @@ def test_human_detection():
     total_humans = 0
     images_with_humans = 0
     
-    for idx, img_path in enumerate(image_files, 1):
-        # Read image
-        img = cv2.imread(str(img_path))
-        if img is None:
-            print(f"  [{idx}/{len(image_files)}] ⚠ Failed to read {img_path.name}")
-            continue
-        
-        # Detect
-        detections = detector.detect(img)
-        count = detections['count']
-        
-        total_humans += count
-        if count > 0:
-            images_with_humans += 1
-        
-        status = f"✓ {count} human(s)" if count > 0 else "  (no humans)"
-        print(f"  [{idx}/{len(image_files)}] {img_path.name:25} {status}")
-        
-        # Store result
-        all_results['results'][img_path.name] = {
-            'timestamp': int(img_path.stem),
-            'detections': detections['detections'],
-            'count': count
-        }
-        
-        # Draw annotations and save
-        if count > 0:
-            annotated = detector.draw_detections(img, detections)
-            output_path = output_dir / f"annotated_{img_path.name}"
-            cv2.imwrite(str(output_path), annotated)
+    # Decoded once, then memory-mapped from test/output/frame_cache
+    frames = load_frames(image_files, IMREAD_FLAGS)
+    
+    # Detect in batches: one YOLOv8 forward pass per BATCH_SIZE images
+    readable = [img for img in frames if img is not None]
+    batch_results = []
+    for start in range(0, len(readable), BATCH_SIZE):
+        batch_results.extend(detector.detect_images(readable[start:start + BATCH_SIZE]))
+    batched = iter(batch_results)
+    
+    # JPEG encoding of annotated images overlaps with the next detection
+    with ThreadPoolExecutor(max_workers=4) as io_pool:
+        for idx, (img_path, img) in enumerate(zip(image_files, frames), 1):
+            if img is None:
+                print(f"  [{idx}/{len(image_files)}] ⚠ Failed to read {img_path.name}")
+                continue
+            
+            detections = next(batched)
+            count = detections['count']
+            
+            total_humans += count
+            if count > 0:
+                images_with_humans += 1
+            
+            status = f"✓ {count} human(s)" if count > 0 else "  (no humans)"
+            print(f"  [{idx}/{len(image_files)}] {img_path.name:25} {status}")
+            
+            # Store result
+            all_results['results'][img_path.name] = {
+                'timestamp': int(img_path.stem),
+                'detections': detections['detections'],
+                'count': count
+            }
+            
+            # Draw annotations and save
+            if count > 0:
+                annotated = detector.draw_detections(img, detections, inplace=True)
+                output_path = output_dir / f"annotated_{img_path.name}"
+                io_pool.submit(cv2.imwrite, str(output_path), annotated)
     
     # Print summary
     print("\n" + "="*60)
@@ -106,8 +124,7 @@ def test_human_detection():
     
     # Save detailed results as JSON
     json_path = output_dir / "detection_results.json"
-    with open(json_path, 'w') as f:
-        json.dump(all_results, f, indent=2)
+    dump_json(all_results, json_path)
     
     print(f"\n✓ Results saved to:")
     print(f"  - {json_path}")
@@ -7,14 +7,35 @@ Tests the person tracking functionality on:
 """
 
 import sys
-import json
+from functools import lru_cache
+from types import SimpleNamespace
 from pathlib import Path
 from datetime import datetime
 
+import numpy as np
+import supervision as sv
+
+TEST_DIR = Path(__file__).resolve().parent
+ROOT_DIR = TEST_DIR.parent
+IMG_DIR = ROOT_DIR / "image" / "IMAGE_001"
+OUTPUT_DIR = TEST_DIR / "output"
+OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
 # Add parent directory to path
-sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(ROOT_DIR))
 
 from person_tracker import PersonTracker, process_images, process_video
+from _frame_cache import sorted_jpgs
+from _json_io import dump_json
+from _warmup import warmup
+
+
+@lru_cache(maxsize=1)
+def _tracker(confidence: float) -> PersonTracker:
+    """One warmed-up PersonTracker (YOLOv8 weights loaded once) shared by all tests"""
+    tracker = PersonTracker(confidence=confidence)
+    warmup(tracker=tracker)
+    return tracker
 
 
 def test_tracking_on_images():
@@ -24,8 +45,8 @@ def test_tracking_on_images():
     print("=" * 80 + "\n")
     
     # Setup paths
-    img_dir = Path(__file__).parent.parent / "image" / "IMAGE_001"
-    output_dir = Path(__file__).parent / "output" / "tracked_images"
+    img_dir = IMG_DIR
+    output_dir = OUTPUT_DIR / "tracked_images"
     output_dir.mkdir(exist_ok=True, parents=True)
     
     if not img_dir.exists():
@@ -33,10 +54,7 @@ def test_tracking_on_images():
         return
     
     # Get all images sorted by filename
-    image_files = sorted(
-        img_dir.glob("*.jpg"),
-        key=lambda p: int(p.stem)
-    )[:100]  # Test with first 100 images
+    image_files = sorted_jpgs(img_dir)[:100]  # Test with first 100 images
     
     if not image_files:
         print(f"❌ No images found in {img_dir}")
@@ -49,7 +67,7 @@ def test_tracking_on_images():
         summary = process_images(
             image_paths=[str(p) for p in image_files],
             output_dir=str(output_dir),
-            confidence=0.5
+            tracker=_tracker(0.5)
         )
         
         # Print summary
@@ -70,9 +88,8 @@ def test_tracking_on_images():
                 print()
         
         # Save summary to JSON
-        summary_file = Path(__file__).parent / "output" / "tracking_summary.json"
-        with open(summary_file, 'w', encoding='utf-8') as f:
-            json.dump(summary, f, indent=2, ensure_ascii=False)
+        summary_file = OUTPUT_DIR / "tracking_summary.json"
+        dump_json(summary, summary_file)
         
         print(f"✓ Summary saved to: {summary_file}")
         print(f"✓ Annotated images saved to: {output_dir}\n")
@@ -96,7 +113,7 @@ def test_tracking_on_video():
     print("=" * 80 + "\n")
     
     # Look for video files in test directory
-    test_dir = Path(__file__).parent
+    test_dir = TEST_DIR
     video_files = list(test_dir.glob("*.mp4")) + list(test_dir.glob("*.avi"))
     
     if not video_files:
@@ -115,8 +132,8 @@ def test_tracking_on_video():
         summary = process_video(
             video_path=str(video_path),
             output_path=str(output_path),
-            confidence=0.5,
-            display=False  # Set to True to see real-time display
+            display=False,  # Set to True to see real-time display
+            tracker=_tracker(0.5)
         )
         
         # Print summary
@@ -149,14 +166,14 @@ def test_basic_tracker():
     print("TEST 3: Basic Tracker Test (Single Image)")
     print("=" * 80 + "\n")
     
-    img_dir = Path(__file__).parent.parent / "image" / "IMAGE_001"
+    img_dir = IMG_DIR
     
     if not img_dir.exists():
         print(f"❌ Image directory not found: {img_dir}")
         return
     
     # Get first image
-    image_files = sorted(img_dir.glob("*.jpg"))
+    image_files = sorted_jpgs(img_dir)
     if not image_files:
         print(f"❌ No images found in {img_dir}")
         return
@@ -169,7 +186,8 @@ def test_basic_tracker():
         import cv2
         
         # Initialize tracker
-        tracker = PersonTracker(confidence=0.5)
+        tracker = _tracker(0.5)
+        tracker.reset()
         
         # Load image
         frame = cv2.imread(str(test_image))
@@ -188,7 +206,7 @@ def test_basic_tracker():
             print(f"  - Tracking IDs: {[int(id) for id in detections.tracker_id]}")
         
         # Save annotated image
-        output_path = Path(__file__).parent / "output" / "test_tracking_single.jpg"
+        output_path = OUTPUT_DIR / "test_tracking_single.jpg"
         output_path.parent.mkdir(exist_ok=True, parents=True)
         cv2.imwrite(str(output_path), annotated_frame)
         
@@ -206,6 +224,41 @@ def test_basic_tracker():
         return
 
 
+def test_face_assignment_overlapping_boxes():
+    """A face inside two overlapping person boxes is assigned to one track only"""
+    print("=" * 80)
+    print("TEST 4: Face Assignment with Overlapping Person Boxes")
+    print("=" * 80 + "\n")
+    
+    tracker = _tracker(0.5)
+    tracker.reset()
+    
+    # One face detected in the frame, at the head of person 1 but also inside
+    # the box of person 2, who stands partly in front of them
+    face = SimpleNamespace(face_id=7, bbox=(90, 10, 110, 30))
+    detections = sv.Detections(
+        xyxy=np.array([[60, 0, 140, 200], [100, 15, 220, 215]], dtype=np.float32),
+        tracker_id=np.array([1, 2])
+    )
+    
+    saved = (tracker.face_recognizer, tracker.face_recognize_every)
+    tracker.face_recognizer = SimpleNamespace(detect_faces=lambda frame: [face])
+    tracker.face_recognize_every = 1
+    try:
+        tracker._update_person_info(detections)
+        tracker._process_faces(np.zeros((240, 320, 3), dtype=np.uint8), detections)
+    finally:
+        tracker.face_recognizer, tracker.face_recognize_every = saved
+    
+    print(f"✓ Face IDs by track: { {tid: p.face_id for tid, p in tracker.persons.items()} }")
+    assert tracker.persons[1].face_id == 7
+    assert tracker.persons[2].face_id is None
+    assert list(tracker.track_id_to_unique_id) == [1]
+    assert tracker.face_id_to_track_id == {7: 1}
+    
+    tracker.reset()
+
+
 if __name__ == "__main__":
     print("\n🚀 PERSON TRACKER TESTING SUITE\n")
     
@@ -213,6 +266,7 @@ if __name__ == "__main__":
     test_basic_tracker()
     test_tracking_on_images()
     test_tracking_on_video()
+    test_face_assignment_overlapping_boxes()
     
     print("=" * 80)
     print("✅ ALL TESTS COMPLETE!")
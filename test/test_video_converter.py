@@ -8,8 +8,14 @@ import os
 from pathlib import Path
 import logging
 
+TEST_DIR = Path(__file__).resolve().parent
+ROOT_DIR = TEST_DIR.parent
+IMG_DIR = ROOT_DIR / "image" / "IMAGE_001"
+OUTPUT_DIR = TEST_DIR / "output"
+OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
 # Add parent directory to path so we can import image_to_video
-sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(ROOT_DIR))
 
 from image_to_video import (
     create_video_from_images,
@@ -47,7 +53,7 @@ def test_get_sorted_images():
     logger.info("Test 2: Image Collection and Sorting")
     logger.info("=" * 60)
     
-    image_dir = Path(__file__).parent.parent / "image" / "IMAGE_001"
+    image_dir = IMG_DIR
     
     if not image_dir.exists():
         logger.error(f"Image directory not found: {image_dir}")
@@ -71,8 +77,8 @@ def test_create_video():
     logger.info("=" * 60)
     
     # Set up paths
-    image_dir = Path(__file__).parent.parent / "image" / "IMAGE_001"
-    output_dir = Path(__file__).parent / "output"
+    image_dir = IMG_DIR
+    output_dir = OUTPUT_DIR
     output_video = output_dir / "test_video.mp4"
     
     if not image_dir.exists():
@@ -112,7 +118,7 @@ def test_create_video_from_device():
     
     # Change to parent directory to use relative paths
     original_cwd = os.getcwd()
-    test_dir = Path(__file__).parent.parent
+    test_dir = ROOT_DIR
     os.chdir(test_dir)
     
     try:
@@ -121,7 +127,7 @@ def test_create_video_from_device():
         video_path = create_video_from_device_folder(
             device_id="IMAGE_001",
             base_image_dir="image",
-            output_dir=str(Path(__file__).parent / "output"),
+            output_dir=str(OUTPUT_DIR),
             auto_fps=True
         )
         
@@ -161,7 +167,7 @@ def main():
         logger.info("=" * 60)
         logger.info("✓ All tests completed!")
         logger.info("\nOutput location:")
-        logger.info(f"  {Path(__file__).parent / 'output'}\n")
+        logger.info(f"  {OUTPUT_DIR}\n")
         
     except Exception as e:
         logger.error(f"Test failed with error: {str(e)}", exc_info=True)
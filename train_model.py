@@ -1,15 +1,149 @@
 import face_recognition
 import cv2
 import os
-import pickle
+import json
+import hashlib
 import numpy as np
+from multiprocessing import Pool
 from pathlib import Path
 
+try:
+    import dlib
+    DLIB_CUDA_AVAILABLE = bool(dlib.DLIB_USE_CUDA)
+except (ImportError, AttributeError):
+    DLIB_CUDA_AVAILABLE = False
+
 # --- ตั้งค่า ---
 TRAIN_DIR = "train_images"
 DB_PATH = "test/output/face_database.pkl"
 ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
-MODEL = "hog"  # หรือ "cnn" ถ้ามี GPU (hog เร็วกว่าแต่แม่นน้อยกว่านิดหน่อย)
+# ถ้า dlib build มากับ CUDA ใช้ "cnn" บน GPU (แม่นกว่าและเร็วกว่าเมื่อทำเป็น batch)
+# ไม่งั้นใช้ "hog" บน CPU แบบหลาย process
+MODEL = "cnn" if DLIB_CUDA_AVAILABLE else "hog"
+WORKERS = os.cpu_count() or 1  # จำนวน process ที่ใช้ encode ภาพพร้อมกัน (dlib ใช้ได้แค่ 1 core ต่อภาพ)
+CNN_BATCH_SIZE = 32  # จำนวนภาพต่อ batch ที่ส่งเข้า GPU (โหมด cnn)
+# แคช encoding ของแต่ละภาพ (key = path + mtime + size + MODEL) ภาพที่ไม่เปลี่ยนไม่ต้อง encode ใหม่
+ENCODING_CACHE_DIR = Path(".cache/encodings")
+
+def _cache_path(img_path):
+    """ไฟล์แคชของภาพนี้ (เปลี่ยนชื่อเองเมื่อภาพถูกแก้ไข)"""
+    stat = img_path.stat()
+    key = hashlib.sha1(
+        f"{img_path.resolve()}|{stat.st_mtime_ns}|{stat.st_size}|{MODEL}".encode()
+    ).hexdigest()
+    return ENCODING_CACHE_DIR / f"{key}.npy"
+
+def _load_cached(cache_path):
+    """
+    คืนค่า (เจอแคชไหม, encoding หรือ None)
+    แคชว่าง (ขนาด 0) = ภาพนี้ไม่มีใบหน้า
+    """
+    try:
+        encoding = np.load(cache_path)
+    except (OSError, ValueError):
+        return False, None
+    return True, (encoding if encoding.size else None)
+
+def _store_cached(cache_path, encoding):
+    """เขียนแคชแบบ atomic (เขียนไฟล์ชั่วคราวแล้ว rename) กันไฟล์ขาดเมื่อหลาย process เขียนพร้อมกัน"""
+    try:
+        ENCODING_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f"{cache_path.stem}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, encoding if encoding is not None else np.empty(0, dtype=np.float64))
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # แคชเป็นแค่ตัวช่วย เขียนไม่ได้ก็ train ต่อได้
+
+def _largest_face(face_locations):
+    """เลือกหน้าที่ใหญ่สุด (face_locations เป็น (top, right, bottom, left))"""
+    return max(face_locations, key=lambda b: (b[2] - b[0]) * (b[1] - b[3]))
+
+def _encode_one(job):
+    """
+    Encode ใบหน้าจากภาพ 1 ไฟล์ (รันใน worker process)
+    คืนค่า (person_id, ชื่อไฟล์, encoding หรือ None, ข้อความ error หรือ None)
+    """
+    img_path, person_id = job
+    try:
+        cache_path = _cache_path(img_path)
+        hit, encoding = _load_cached(cache_path)
+        if hit:
+            return person_id, img_path.name, encoding, None
+        
+        # โหลดภาพผ่าน face_recognition (มันจัดการโหลดเป็น RGB ให้เอง)
+        image = face_recognition.load_image_file(str(img_path))
+        
+        # หาตำแหน่งใบหน้า (เพื่อให้ชัวร์ว่ามีหน้าคน)
+        face_locations = face_recognition.face_locations(image, model=MODEL)
+        
+        if not face_locations:
+            _store_cached(cache_path, None)
+            return person_id, img_path.name, None, None
+        
+        # แปลงเป็น Vector (Encoding)
+        # ปกติ 1 รูปควรมี 1 คน ถ้ามีหลายคนให้เลือกหน้าที่ใหญ่สุด
+        # และ encode เฉพาะหน้านั้น (ไม่เสียเวลาหา landmark/encode หน้าอื่น)
+        encodings = face_recognition.face_encodings(image, [_largest_face(face_locations)])
+        
+        encoding = encodings[0] if len(encodings) > 0 else None
+        _store_cached(cache_path, encoding)
+        return person_id, img_path.name, encoding, None
+    
+    except Exception as e:
+        return person_id, img_path.name, None, str(e)
+
+def _encode_batched(jobs):
+    """
+    Encode ภาพแบบ batch ด้วย CNN บน GPU (รันใน process เดียว)
+    yield ผลลัพธ์รูปแบบเดียวกับ _encode_one ตามลำดับงาน
+    """
+    for start in range(0, len(jobs), CNN_BATCH_SIZE):
+        chunk = jobs[start:start + CNN_BATCH_SIZE]
+        results = [None] * len(chunk)
+        images = {}
+        cache_paths = {}
+        
+        for i, (img_path, person_id) in enumerate(chunk):
+            try:
+                cache_paths[i] = _cache_path(img_path)
+                hit, encoding = _load_cached(cache_paths[i])
+                if hit:
+                    results[i] = (person_id, img_path.name, encoding, None)
+                    continue
+                images[i] = face_recognition.load_image_file(str(img_path))
+            except Exception as e:
+                results[i] = (person_id, img_path.name, None, str(e))
+        
+        # batch_face_locations ต้องการภาพขนาดเดียวกันทั้ง batch -> แยกกลุ่มตามขนาด
+        groups = {}
+        for i, image in images.items():
+            groups.setdefault(image.shape, []).append(i)
+        
+        for indices in groups.values():
+            try:
+                batch_locations = face_recognition.batch_face_locations(
+                    [images[i] for i in indices],
+                    batch_size=len(indices)
+                )
+            except Exception as e:
+                for i in indices:
+                    results[i] = (chunk[i][1], chunk[i][0].name, None, str(e))
+                continue
+            
+            for i, face_locations in zip(indices, batch_locations):
+                img_path, person_id = chunk[i]
+                if not face_locations:
+                    _store_cached(cache_paths[i], None)
+                    results[i] = (person_id, img_path.name, None, None)
+                    continue
+                
+                encodings = face_recognition.face_encodings(images[i], [_largest_face(face_locations)])
+                encoding = encodings[0] if len(encodings) > 0 else None
+                _store_cached(cache_paths[i], encoding)
+                results[i] = (person_id, img_path.name, encoding, None)
+        
+        yield from results
 
 def train():
     print(f"🚀 เริ่มต้นการ Train Model จากโฟลเดอร์: {TRAIN_DIR}")
@@ -38,62 +172,66 @@ def train():
 
     print(f"found {len(person_dirs)} people folders: {[d.name for d in person_dirs]}\n")
 
+    # รวมรายการภาพทั้งหมดเป็นงาน (path, person_id) เพื่อกระจายให้หลาย process
+    jobs = []
     for person_dir in person_dirs:
-        person_name = person_dir.name
-        print(f"👤 กำลังประมวลผล: {person_name} (ID: {current_face_id})")
-        
-        # เก็บชื่อคู่กับ ID
-        known_face_names[current_face_id] = person_name
+        # เก็บชื่อคู่กับ ID (ยึดตามโฟลเดอร์ 1 โฟลเดอร์ = 1 ID)
+        known_face_names[current_face_id] = person_dir.name
         
         # หาไฟล์รูปในโฟลเดอร์นั้น
-        image_files = [
-            f for f in person_dir.iterdir() 
+        jobs.extend(
+            (f, current_face_id) for f in person_dir.iterdir()
             if f.suffix.lower() in ALLOWED_EXTENSIONS
-        ]
-        
-        count_added = 0
+        )
         
-        for img_path in image_files:
-            try:
-                # โหลดภาพผ่าน face_recognition (มันจัดการโหลดเป็น RGB ให้เอง)
-                image = face_recognition.load_image_file(str(img_path))
-                
-                # หาตำแหน่งใบหน้า (เพื่อให้ชัวร์ว่ามีหน้าคน)
-                face_locations = face_recognition.face_locations(image, model=MODEL)
-                
-                if not face_locations:
-                    print(f"  Warning: ไม่พบใบหน้าในภาพ {img_path.name}")
-                    continue
-                
-                # แปลงเป็น Vector (Encoding)
-                # ปกติ 1 รูปควรมี 1 คน ถ้ามีหลายคน อาจจะต้องเลือกหน้าทีใหญ่สุด
-                # แต่ที่นี่เราสมมติว่า crop มาดีแล้ว หรือเอาหน้าแรกที่เจอ
-                encodings = face_recognition.face_encodings(image, face_locations)
-                
-                if len(encodings) > 0:
-                    # เอาหน้าแรกที่เจอ (ปกติควรมีหน้าเดียวต่อไฟล์เทรน)
-                    encoding = encodings[0]
-                    
-                    known_face_encodings.append(encoding)
-                    known_face_ids.append(current_face_id)
-                    count_added += 1
-                    print(f"  ✓ เพิ่มข้อมูลจาก {img_path.name}")
-                    
-            except Exception as e:
-                print(f"  ❌ Error processing {img_path.name}: {e}")
-        
-        print(f"  -> สรุป: เพิ่ม {count_added} ใบหน้าสำหรับ {person_name}")
-        print("-" * 30)
-        
-        # ขยับไปคนถัดไป (ถ้าเจอน่าอย่างน้อย 1 รูป ค่อยเลื่อน ID ก็ได้)
-        # แต่เพื่อความง่าย ยึดตามโฟลเดอร์เลย
         current_face_id += 1
+    
+    counts_added = {face_id: 0 for face_id in known_face_names}
+    
+    if MODEL == "cnn":
+        # GPU: process เดียว ส่งภาพเข้า CNN ทีละ batch
+        print(f"🧵 Encode {len(jobs)} ภาพด้วย CNN (GPU) ทีละ {CNN_BATCH_SIZE} ภาพ\n")
+        pool = None
+        results = _encode_batched(jobs)
+    else:
+        # CPU: กระจายภาพให้หลาย process
+        # imap คืนผลตามลำดับงาน ทำให้ลำดับใน database เหมือนเดิมทุกครั้ง
+        print(f"🧵 Encode {len(jobs)} ภาพด้วย {WORKERS} process\n")
+        pool = Pool(WORKERS)
+        chunksize = max(1, len(jobs) // (WORKERS * 4))
+        results = pool.imap(_encode_one, jobs, chunksize=chunksize)
+    
+    try:
+        for person_id, filename, encoding, error in results:
+            if error is not None:
+                print(f"  ❌ Error processing {filename}: {error}")
+            elif encoding is None:
+                print(f"  Warning: ไม่พบใบหน้าในภาพ {filename}")
+            else:
+                known_face_encodings.append(encoding)
+                known_face_ids.append(person_id)
+                counts_added[person_id] += 1
+                print(f"  ✓ เพิ่มข้อมูลจาก {filename} ({known_face_names[person_id]})")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    
+    print()
+    for face_id, person_name in known_face_names.items():
+        print(f"👤 {person_name} (ID: {face_id}) -> สรุป: เพิ่ม {counts_added[face_id]} ใบหน้า")
+    print("-" * 30)
 
     # 3. บันทึกลงไฟล์
-    data = {
-        'encodings': known_face_encodings,
+    # encodings ทั้งหมดเป็น matrix float32 (N, 128) ก้อนเดียวใน .npy (โหลดแบบ memory-map ได้)
+    # ส่วน ids/names เก็บใน .json คู่กัน (รูปแบบเดียวกับ FaceRecognizer.save_database)
+    encodings_path = Path(DB_PATH).with_suffix('.npy')
+    meta_path = Path(DB_PATH).with_suffix('.json')
+    
+    encoding_matrix = np.asarray(known_face_encodings, dtype=np.float32).reshape(-1, 128)
+    meta = {
         'ids': known_face_ids,
-        'names': known_face_names,
+        'names': {str(face_id): name for face_id, name in known_face_names.items()},
         'next_id': current_face_id,
         'tolerance': 0.6
     }
@@ -101,10 +239,11 @@ def train():
     # สร้างโฟลเดอร์ปลายทางถ้ายังไม่มี
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     
-    with open(DB_PATH, 'wb') as f:
-        pickle.dump(data, f)
+    np.save(encodings_path, encoding_matrix)
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
         
-    print(f"\n✅ บันทึกข้อมูลเสร็จสิ้นที่: {DB_PATH}")
+    print(f"\n✅ บันทึกข้อมูลเสร็จสิ้นที่: {encodings_path} + {meta_path.name}")
     print(f"   จำนวน ID ทั้งหมด: {len(known_face_names)}")
     print(f"   จำนวนตัวอย่างใบหน้าทั้งหมด: {len(known_face_ids)}")
 
@@ -10,9 +10,18 @@ import pyaudio
 import numpy as np
 import openwakeword
 from openwakeword.model import Model
-import requests
 import time
 import os
+import threading
+
+from jarvis_client import JarvisClient
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
 # โหลดโมเดล python -c "import openwakeword; openwakeword.utils.download_models()"
 # --- ตั้งค่า ---
 JARVIS_API_URL = "http://localhost:3000/api/trigger"
@@ -21,27 +30,67 @@ MODEL_PATH = os.path.join(os.path.dirname(__file__), "models", "hey__act_bot__ku
 MODEL_NAME = "hey__act_bot__kuung" # ชื่อโมเดลที่ใช้ดึง score จาก prediction
 THRESHOLD = 0.5 # เพิ่มขึ้นนิดหน่อยเพื่อความแม่นยำ (0.0 - 1.0)
 COOLDOWN_SECONDS = 4 # เพิ่มเวลาพักหน่อยครับ
+RING_CHUNKS = 32 # ขนาด ring buffer เสียง (32 x 80ms ≈ 2.5 วินาที)
+WARMUP_CHUNKS = 20 # รัน model กับเสียงเงียบก่อนเริ่มฟังจริง (ให้ ONNX Runtime จอง memory ให้เสร็จ)
+PIN_CPU = True # ผูก process ไว้กับ core เดียว + เพิ่ม priority (ลด jitter ของ loop เสียง)
+
+# ส่งคำสั่งจาก background thread: loop อ่านเสียงไม่ต้องรอ HTTP (กัน PyAudio buffer overflow)
+jarvis = JarvisClient(JARVIS_API_URL, timeout=1)
+
+def _on_trigger_done(response, error):
+    """ผลการยิง API (เรียกจาก background thread)"""
+    if error is not None:
+        print(f"⚠️ Connection error: {error}")
+    elif response.status_code == 200:
+        print("✅ Command sent!")
+    else:
+        print(f"⚠️ API error: {response.status_code}")
 
 def trigger_jarvis():
-    """ยิง API ไปปลุก Jarvis"""
+    """ยิง API ไปปลุก Jarvis (ไม่บล็อก)"""
+    # ยิงคำสั่งเดียว: ปลุก + ทักทาย
+    print("🚀 Sending Wake & Greet command...")
+    if not jarvis.send({"action": "start"}, on_done=_on_trigger_done):
+        print("⚠️ Jarvis queue full, command dropped")
+
+class AudioRing:
+    """
+    Ring buffer เสียงที่จองไว้ล่วงหน้า: PyAudio callback เขียน, loop หลักอ่าน
+    (ผู้เขียน 1 / ผู้อ่าน 1) ไม่มีการจอง memory ใหม่ต่อ chunk
+    """
+    def __init__(self, n_chunks: int, chunk_size: int):
+        self.buffer = np.empty((n_chunks, chunk_size), dtype=np.int16)
+        self.written = 0  # จำนวน chunk ที่เขียนไปแล้วทั้งหมด
+        self.ready = threading.Event()
+
+    def callback(self, in_data, frame_count, time_info, status):
+        """เรียกจาก thread ของ PyAudio ทุกครั้งที่มีเสียงเข้ามา 1 chunk"""
+        self.buffer[self.written % len(self.buffer)] = np.frombuffer(in_data, dtype=np.int16)
+        self.written += 1
+        self.ready.set()
+        return (None, pyaudio.paContinue)
+
+def pin_realtime():
+    """ผูก process ไว้กับ core สุดท้ายและเพิ่ม priority (ต้องมี psutil, ไม่ได้ก็ข้ามไป)"""
+    if not PSUTIL_AVAILABLE:
+        return
+    
+    proc = psutil.Process()
     try:
-        # ยิงคำสั่งเดียว: ปลุก + ทักทาย
-        print("🚀 Sending Wake & Greet command...")
-        response = requests.post(
-            JARVIS_API_URL,
-            json={
-                "action": "start", 
-            },
-            timeout=1
-        )
-        
-        if response.status_code == 200:
-             print("✅ Command sent!")
+        cores = proc.cpu_affinity()
+        if len(cores) > 1:
+            # core 0 มักรับ interrupt ของระบบ เลยใช้ core สุดท้ายแทน
+            proc.cpu_affinity([cores[-1]])
+    except (AttributeError, psutil.Error):
+        pass  # macOS ไม่รองรับ cpu_affinity
+    
+    try:
+        if hasattr(psutil, "HIGH_PRIORITY_CLASS"):
+            proc.nice(psutil.HIGH_PRIORITY_CLASS)  # Windows
         else:
-            print(f"⚠️ API error: {response.status_code}")
-            
-    except Exception as e:
-        print(f"⚠️ Connection error: {e}")
+            proc.nice(-10)  # Linux/macOS (ต้องมีสิทธิ์ root)
+    except (psutil.Error, OSError):
+        pass
 
 def main():
     print("=" * 50)
@@ -62,42 +111,66 @@ def main():
         return
 
     print("✅ Model loaded!")
+    
+    # Warm-up: chunk แรกๆ จะช้ากว่าปกติ (ONNX Runtime จอง memory) ทำให้เสร็จก่อนเปิดไมค์
+    silence = np.zeros(CHUNK_SIZE, dtype=np.int16)
+    for _ in range(WARMUP_CHUNKS):
+        owwModel.predict(silence)
+    owwModel.reset()
+    
+    if PIN_CPU:
+        pin_realtime()
 
-    # เปิดไมโครโฟน
+    # เปิดไมโครโฟน (โหมด callback: PyAudio เขียนเสียงลง ring buffer เอง ไม่ต้องรอ read)
+    ring = AudioRing(RING_CHUNKS, CHUNK_SIZE)
     p = pyaudio.PyAudio()
     stream = p.open(
         format=pyaudio.paInt16,
         channels=1,
         rate=16000,
         input=True,
-        frames_per_buffer=CHUNK_SIZE
+        frames_per_buffer=CHUNK_SIZE,
+        stream_callback=ring.callback
     )
 
     print(f"\n👂 Listening for '{MODEL_NAME}'...")
     print("   (Note: ลองพูด 'Hey Act Bot Kuung' ชัดๆ)")
     
     last_trigger = 0
+    read_count = 0  # จำนวน chunk ที่ส่งเข้า model ไปแล้ว
 
     try:
         while True:
-            # อ่านข้อมูลเสียง
-            audio_data = np.frombuffer(stream.read(CHUNK_SIZE), dtype=np.int16)
-            
-            # ส่งเข้า Model Prediction
-            prediction = owwModel.predict(audio_data)
+            # รอเสียง chunk ใหม่ (timeout สั้นๆ ให้ Ctrl+C ยังทำงานได้)
+            if not ring.ready.wait(timeout=0.5):
+                continue
+            ring.ready.clear()
+            written = ring.written
             
-            # prediction เป็น dict เช่น {'hey_jarvis': 0.002, ...}
-            score = prediction[MODEL_NAME]
+            # ถ้า model ตามไม่ทัน ข้าม chunk เก่าที่กำลังจะถูกเขียนทับ
+            if written - read_count > RING_CHUNKS - 1:
+                print(f"⚠️ Audio overrun: skipped {written - read_count - (RING_CHUNKS - 1)} chunk(s)")
+                read_count = written - (RING_CHUNKS - 1)
             
-            if score > THRESHOLD:
-                now = time.time()
+            # ส่งทุก chunk ตามลำดับเข้า Model (model ต้องการเสียงต่อเนื่อง)
+            while read_count < written:
+                audio_data = ring.buffer[read_count % RING_CHUNKS]
+                read_count += 1
+                
+                prediction = owwModel.predict(audio_data)
+                
+                # prediction เป็น dict เช่น {'hey_jarvis': 0.002, ...}
+                score = prediction[MODEL_NAME]
                 
-                # เช็ค Cooldown ก่อนค่อยพิมพ์/ประมวลผล
-                if now - last_trigger > COOLDOWN_SECONDS:
-                    print(f"⚡ Wake Word Detected! (Score: {score:.3f})")
-                    trigger_jarvis()
-                    last_trigger = now
-                # ถ้าไม่พ้น Cooldown จะเงียบไว้ ไม่พิมพ์รัวๆ แล้วครับ
+                if score > THRESHOLD:
+                    now = time.time()
+                    
+                    # เช็ค Cooldown ก่อนค่อยพิมพ์/ประมวลผล
+                    if now - last_trigger > COOLDOWN_SECONDS:
+                        print(f"⚡ Wake Word Detected! (Score: {score:.3f})")
+                        trigger_jarvis()
+                        last_trigger = now
+                    # ถ้าไม่พ้น Cooldown จะเงียบไว้ ไม่พิมพ์รัวๆ แล้วครับ
 
     except KeyboardInterrupt:
         print("\n⏹️  Stopping...")
@@ -9,18 +9,34 @@ pip install zmq pyzmq opencv-python face_recognition requests
 import cv2
 import zmq
 import time
-import requests
 import face_recognition
 import numpy as np
+import os
+import json
 import pickle
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 
+from jarvis_client import JarvisClient
+
+from camera_service import FRAME_HEADER, FORMAT_RAW
+
+try:
+    import dlib
+    DLIB_CUDA_AVAILABLE = bool(dlib.DLIB_USE_CUDA)
+except (ImportError, AttributeError):
+    DLIB_CUDA_AVAILABLE = False
+
 # --- ตั้งค่า ---
 DB_PATH = "test/output/face_database.pkl"
 TOLERANCE = 0.45  # ค่า distance ที่ยอมรับ
-MODEL = "hog"    # hog สำหรับ CPU
-PROCESS_EVERY_N_FRAMES = 30
+# ถ้า dlib build มากับ CUDA: CNN บน GPU ประมวลผลทุกเฟรมเป็น batch
+# ไม่งั้น: HOG บน CPU ทุกๆ 30 เฟรม
+MODEL = "cnn" if DLIB_CUDA_AVAILABLE else "hog"
+PROCESS_EVERY_N_FRAMES = 1 if MODEL == "cnn" else 30
+CNN_BATCH_SIZE = 8  # จำนวนเฟรมต่อ batch ที่ส่งเข้า GPU (โหมด cnn)
+LANDMARK_MODEL = "small"  # จุด landmark สำหรับจัดหน้าก่อน encode: "small" (5 จุด เร็วกว่า) หรือ "large" (68 จุด)
 FRAME_RESIZE_SCALE = 0.25
 
 # --- ZMQ ---
@@ -31,6 +47,7 @@ ZMQ_PORT = 5555
 JARVIS_API_URL = "http://localhost:3000/api/trigger"
 JARVIS_ENABLED = True
 GREETING_COOLDOWN = 60
+GREETING_COOLDOWN_NS = GREETING_COOLDOWN * 1_000_000_000
 
 # --- Name Mapping ---
 NAME_MAPPING = {
@@ -41,82 +58,203 @@ NAME_MAPPING = {
     "p_ohm": "พี่โอม",
 }
 
+def _normalize_rows(encodings):
+    """encodings (N, 128) -> matrix float32 ต่อเนื่องที่แต่ละแถวยาว 1"""
+    encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, 128)
+    norms = np.linalg.norm(encodings, axis=1, keepdims=True)
+    return np.ascontiguousarray(encodings / np.maximum(norms, np.float32(1e-12)))
+
+@lru_cache(maxsize=None)
+def greeting_payload(name: str | None):
+    """ข้อความทักทาย + JSON ที่ encode แล้ว (สร้างครั้งเดียวต่อชื่อ แล้วใช้ซ้ำ)"""
+    if name:
+        message = f"กล่าวทักทาย {NAME_MAPPING.get(name, name)} หน่อย พร้อมเอ่ยชื่อ"
+    else:
+        message = "ทักทายคนแปลกหน้าหน่อย พร้อมถามชื่อ"
+    payload = json.dumps({"action": "wakeAndGreet", "message": message}, ensure_ascii=False).encode("utf-8")
+    return message, payload
+
 class FaceDatabase:
     """โหลดและจัดการฐานข้อมูลใบหน้า"""
     def __init__(self, db_path: str):
         self.db_path = db_path
-        self.encodings = []
+        self.encodings = np.empty((0, 128), dtype=np.float32)
         self.ids = []
+        # slot ของ cooldown การทักทาย: 0 = คนแปลกหน้า, 1.. = แต่ละ face id
+        self.row_slots = np.zeros(0, dtype=np.intp)
+        self.next_greet_ns = np.zeros(1, dtype=np.int64)
         self.names = {}
         self.load()
     
     def load(self):
-        if not Path(self.db_path).exists():
+        npy_path = Path(self.db_path).with_suffix('.npy')
+        json_path = Path(self.db_path).with_suffix('.json')
+        
+        if npy_path.exists() and json_path.exists():
+            # รูปแบบปัจจุบัน: encodings (N, 128) float32 ใน .npy + ids/names ใน .json
+            # เปิด matrix ที่ normalize แล้วแบบ memory-map (read-only)
+            # หลาย process/worker ที่โหลดฐานข้อมูลเดียวกันจะใช้ page เดียวกันใน RAM ไม่ต้องมีคนละชุด
+            unit_path = self._unit_encodings(npy_path)
+            if unit_path is not None:
+                encodings = np.load(unit_path, mmap_mode='r')
+            else:
+                # เขียนไฟล์ข้างฐานข้อมูลไม่ได้ (โฟลเดอร์ read-only/สิทธิ์คนละ user) -> normalize ใน memory
+                encodings = _normalize_rows(np.load(npy_path))
+            with open(json_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            ids = meta['ids']
+            names = {int(fid): name for fid, name in meta.get('names', {}).items()}
+        elif Path(self.db_path).exists():
+            # ไฟล์ pickle แบบเก่า (normalize ใน memory ของ process นี้)
+            with open(self.db_path, 'rb') as f:
+                data = pickle.load(f)
+            encodings = _normalize_rows(data['encodings'])
+            ids = data['ids']
+            names = data['names']
+        else:
             print(f"⚠️  ไม่พบฐานข้อมูลที่ {self.db_path}")
             return False
         
-        with open(self.db_path, 'rb') as f:
-            data = pickle.load(f)
+        # matrix float32 (N, 128) ที่ normalize ให้ยาว 1 ไว้แล้ว
+        # ตอนค้นหาเหลือแค่ dot product (matrix-vector ครั้งเดียว ไม่ต้องสร้าง array ผลต่าง)
+        self.encodings = encodings
+        self.ids = ids
+        self.names = names
         
-        self.encodings = data['encodings']
-        self.ids = data['ids']
-        self.names = data['names']
+        # เวลาที่ทักได้อีกครั้ง (time.monotonic_ns) เก็บใน array ตาม slot ของแต่ละ face id
+        # ไม่ต้องใช้ dict + float ทุกครั้งที่เจอหน้า
+        unique_ids, row_slots = np.unique(np.asarray(ids, dtype=np.int64), return_inverse=True)
+        self.row_slots = row_slots.astype(np.intp) + 1
+        self.next_greet_ns = np.zeros(len(unique_ids) + 1, dtype=np.int64)
         print(f"✅ โหลดฐานข้อมูลสำเร็จ: {len(self.encodings)} ตัวอย่าง")
         return True
 
+    @staticmethod
+    def _unit_encodings(npy_path):
+        """
+        คืน path ของ <db>.unit.npy = encodings ที่ normalize แล้ว (None ถ้าเขียนไฟล์ไม่ได้)
+        สร้างครั้งแรก และสร้างใหม่เมื่อ .npy ถูก train ทับ
+        เขียนไฟล์ชั่วคราวแล้ว rename กันหลาย process เขียนชนกัน/อ่านเจอไฟล์ครึ่งๆ
+        """
+        unit_path = npy_path.with_suffix('.unit.npy')
+        tmp_path = unit_path.with_name(f"{unit_path.name}.{os.getpid()}.tmp")
+        try:
+            if not unit_path.exists() or unit_path.stat().st_mtime_ns < npy_path.stat().st_mtime_ns:
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, _normalize_rows(np.load(npy_path)))
+                os.replace(tmp_path, unit_path)
+        except OSError as e:
+            print(f"⚠️  สร้าง {unit_path.name} ไม่ได้ ({e}) ใช้ฐานข้อมูลแบบโหลดเข้า memory แทน")
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            return None
+        return unit_path
+
     def find_match(self, face_encoding):
-        if not self.encodings:
-            return None, None
-        
-        distances = face_recognition.face_distance(self.encodings, face_encoding)
-        best_match_idx = distances.argmin()
-        best_distance = distances[best_match_idx]
+        return self.find_matches([face_encoding])[0]
+
+    def find_matches(self, face_encodings):
+        """
+        จับคู่ใบหน้าหลายใบพร้อมกัน คืนค่า [(slot, name หรือ None, distance), ...] ตามลำดับ
+        slot = index ใน next_greet_ns (0 = คนแปลกหน้า)
+        """
+        if len(face_encodings) == 0:
+            return []
+        if len(self.encodings) == 0:
+            return [(0, None, None)] * len(face_encodings)
         
-        if best_distance <= TOLERANCE:
-            face_id = self.ids[best_match_idx]
-            name = self.names.get(face_id, f"ID_{face_id}")
-            return name, best_distance
+        # เวกเตอร์ยาว 1: ||a - b||^2 = 2 - 2 a.b -> ระยะน้อยสุด = dot product มากสุด
+        # ทุกใบหน้าคำนวณใน matrix-matrix ครั้งเดียว (N, 128) @ (128, K)
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, 128)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), np.float32(1e-12))
+        similarities = self.encodings @ queries.T
+        best_match_idx = similarities.argmax(axis=0)
+        best_similarity = similarities[best_match_idx, np.arange(len(queries))]
+        best_distances = np.sqrt(np.maximum(2.0 - 2.0 * best_similarity, 0.0))
         
-        return None, best_distance
+        matches = []
+        for idx, distance in zip(best_match_idx.tolist(), best_distances.tolist()):
+            if distance <= TOLERANCE:
+                face_id = self.ids[idx]
+                matches.append((int(self.row_slots[idx]), self.names.get(face_id, f"ID_{face_id}"), distance))
+            else:
+                matches.append((0, None, distance))
+        return matches
 
 class WebcamServiceZMQ:
     def __init__(self):
         self.db = FaceDatabase(DB_PATH)
-        self.last_greeted = {}
+        self.jarvis = JarvisClient(JARVIS_API_URL, timeout=5)
         self.frame_count = 0
         
         # Setup ZMQ Subscriber
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.SUB)
+        # เก็บแค่เฟรมล่าสุด ถ้า recognition ช้า เฟรมเก่าจะถูกทิ้ง (ไม่สะสมในคิว/memory)
+        # ต้องตั้งก่อน connect
+        self.socket.setsockopt(zmq.CONFLATE, 1)
+        self.socket.setsockopt(zmq.RCVHWM, 1)
         self.socket.connect(f"tcp://{ZMQ_HOST}:{ZMQ_PORT}")
         self.socket.setsockopt_string(zmq.SUBSCRIBE, "")  # Subscribe ทุก topic
 
-    def notify_jarvis(self, name: str | None):
+    def notify_jarvis(self, slot: int, name: str | None):
         if not JARVIS_ENABLED:
             return
         
-        display_name = NAME_MAPPING.get(name, name) if name else None
-        greeting_key = name if name else "unknown"
-        
-        now = time.time()
-        if now - self.last_greeted.get(greeting_key, 0) < GREETING_COOLDOWN:
+        # cooldown แยกตาม slot ของ face id (slot 0 = คนแปลกหน้า)
+        next_greet_ns = self.db.next_greet_ns
+        now = time.monotonic_ns()
+        if now < next_greet_ns[slot]:
             return
         
-        try:
-            if display_name:
-                message = f"กล่าวทักทาย {display_name} หน่อย พร้อมเอ่ยชื่อ"
-            else:
-                message = "ทักทายคนแปลกหน้าหน่อย พร้อมถามชื่อ"
-            
-            print(f"🔔 แจ้งเตือน Jarvis: {message}")
-            requests.post(
-                JARVIS_API_URL,
-                json={"action": "wakeAndGreet", "message": message},
-                timeout=5
-            )
-            self.last_greeted[greeting_key] = now
-        except Exception:
-            pass  # เงียบไว้ถ้าต่อ Jarvis ไม่สำเร็จ
+        message, payload = greeting_payload(name)
+        print(f"🔔 แจ้งเตือน Jarvis: {message}")
+        # ส่งจาก background thread (ไม่บล็อก loop กล้อง)
+        # จองเวลาไว้ก่อน กันเฟรมถัดไปส่งซ้ำระหว่างรอ ถ้าคิวเต็ม (Jarvis ค้าง) คำสั่งนี้ถูกทิ้ง และจะลองใหม่รอบหน้า
+        previous_ns = int(next_greet_ns[slot])
+        reserved_ns = now + GREETING_COOLDOWN_NS
+        next_greet_ns[slot] = reserved_ns
+        
+        def on_done(response, error):
+            # ส่งไม่สำเร็จ (Jarvis อาจยังไม่เปิด): คืนเวลาเดิม ให้ลองทักใหม่ได้ครั้งหน้า
+            if error is not None:
+                print(f"⚠️ Jarvis: ส่งคำสั่งไม่สำเร็จ ({error})")
+                if next_greet_ns[slot] == reserved_ns:
+                    next_greet_ns[slot] = previous_ns
+        
+        if not self.jarvis.send(payload, on_done=on_done):
+            next_greet_ns[slot] = previous_ns
+
+    def recognize(self, rgb_small_frame, face_locations):
+        """Encode ใบหน้าที่เจอ เทียบกับฐานข้อมูล แล้วแจ้ง Jarvis"""
+        face_encodings = face_recognition.face_encodings(
+            rgb_small_frame, face_locations, num_jitters=1, model=LANDMARK_MODEL
+        )
+        
+        if face_encodings:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] 👤 พบใบหน้า {len(face_encodings)} ใบหน้า")
+        
+        # จับคู่ทุกใบหน้าในเฟรมพร้อมกัน
+        for slot, name, distance in self.db.find_matches(face_encodings):
+            # แจ้งเตือน Jarvis
+            self.notify_jarvis(slot, name)
+
+    def process_frame(self, small_frame):
+        """หาใบหน้าในเฟรมเดียวด้วย HOG (CPU)"""
+        # HOG ใช้ gradient ที่แรงสุดข้ามทุก channel ลำดับสีไม่มีผล -> หาบนภาพ BGR ได้เลย
+        # และแปลงเป็น RGB (สำหรับ encoding) เฉพาะตอนเจอหน้าจริง ๆ
+        face_locations = face_recognition.face_locations(small_frame, model=MODEL)
+        if face_locations:
+            self.recognize(cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB), face_locations)
+
+    def process_batch(self, rgb_frames):
+        """หาใบหน้าทุกเฟรมใน batch ด้วย CNN บน GPU (เรียก dlib ครั้งเดียว)"""
+        batch_locations = face_recognition.batch_face_locations(rgb_frames, batch_size=len(rgb_frames))
+        for rgb_small_frame, face_locations in zip(rgb_frames, batch_locations):
+            if face_locations:
+                self.recognize(rgb_small_frame, face_locations)
 
     def run(self):
         print("=" * 60)
@@ -125,46 +263,56 @@ class WebcamServiceZMQ:
         print(f"🔌 Connecting to camera service at tcp://{ZMQ_HOST}:{ZMQ_PORT}")
         print("⏳ รอรับ frames จาก camera_service...")
         print("กด Ctrl+C เพื่อหยุด\n")
+        
+        rgb_batch = []  # เฟรม RGB ที่รอส่งเข้า GPU (โหมด cnn)
 
         try:
             while True:
                 # รับข้อมูลจาก Publisher
-                try:
-                    metadata = self.socket.recv_json(zmq.NOBLOCK)
-                    frame_data = self.socket.recv()
-                except zmq.Again:
-                    time.sleep(0.01)
+                # รอเฟรมใหม่บน socket (ไม่ต้อง sleep วนเช็ค)
+                if not self.socket.poll(timeout=50):
                     continue
                 
-                # Decode frame
-                nparr = np.frombuffer(frame_data, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                # copy=False: ได้ zmq.Frame ที่ชี้ไป buffer ของ ZMQ เลย ไม่ต้อง copy
+                # ข้อมูลเฟรม (~900KB ต่อเฟรมแบบ raw) ออกมาเป็น bytes ทุกข้อความ
+                message = self.socket.recv(copy=False)
+                
+                self.frame_count += 1
+                
+                # ประมวลผลเฉพาะเฟรมที่กำหนด (เฟรมที่ข้ามไม่ต้อง decode เลย)
+                # CONFLATE กันเฟรมค้างในคิว ส่วนตัวนับนี้คุมการใช้ CPU
+                if self.frame_count % PROCESS_EVERY_N_FRAMES != 0:
+                    continue
+                
+                # แยก header ออกจาก frame data
+                _, _, width, height, fmt = FRAME_HEADER.unpack_from(message.buffer)
+                nparr = np.frombuffer(message.buffer, np.uint8, offset=FRAME_HEADER.size)
+                
+                # Decode frame (raw BGR หรือ JPEG ตาม header)
+                if fmt == FORMAT_RAW:
+                    frame = nparr.reshape(height, width, 3)
+                else:
+                    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
                 
                 if frame is None:
                     continue
 
-                self.frame_count += 1
+                # ย่อขนาดเฟรมเพื่อความเร็ว
+                small_frame = cv2.resize(frame, (0, 0), fx=FRAME_RESIZE_SCALE, fy=FRAME_RESIZE_SCALE)
                 
-                # ประมวลผลเฉพาะเฟรมที่กำหนด
-                if self.frame_count % PROCESS_EVERY_N_FRAMES == 0:
-                    # ย่อขนาดเฟรมเพื่อความเร็ว
-                    small_frame = cv2.resize(frame, (0, 0), fx=FRAME_RESIZE_SCALE, fy=FRAME_RESIZE_SCALE)
-                    
-                    # แปลง BGR เป็น RGB
+                if MODEL == "cnn":
+                    # สะสมเฟรมให้ครบ batch แล้วส่งเข้า GPU ทีเดียว
+                    # (batch ต้องเป็นภาพขนาดเดียวกัน ถ้าขนาดเปลี่ยนให้ส่ง batch เดิมไปก่อน)
                     rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-                    
-                    # หาใบหน้า
-                    face_locations = face_recognition.face_locations(rgb_small_frame, model=MODEL)
-                    face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-                    
-                    if face_encodings:
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] 👤 พบใบหน้า {len(face_encodings)} ใบหน้า")
-                    
-                    for face_encoding in face_encodings:
-                        name, distance = self.db.find_match(face_encoding)
-                        
-                        # แจ้งเตือน Jarvis
-                        self.notify_jarvis(name)
+                    if rgb_batch and rgb_batch[0].shape != rgb_small_frame.shape:
+                        self.process_batch(rgb_batch)
+                        rgb_batch = []
+                    rgb_batch.append(rgb_small_frame)
+                    if len(rgb_batch) == CNN_BATCH_SIZE:
+                        self.process_batch(rgb_batch)
+                        rgb_batch = []
+                else:
+                    self.process_frame(small_frame)
 
         except KeyboardInterrupt:
             print("\n⏹️ หยุดการทำงาน...")